@@ -0,0 +1,399 @@
+"""
+수집기 처리량 벤치마크.
+
+실제 거래처 사이트와 Gemini API 없이 main() 전체 흐름을 재현한다.
+- 로컬 HTTP 서버가 영카트 구조의 카테고리/상품 페이지와 여러 크기의 이미지를 제공
+- main.model / main.batch_model 을 지연 시간을 흉내내는 가짜 모델로 교체
+- 카탈로그 크기마다 별도 프로세스에서 main() 과 엑셀 저장을 실행해
+  초당 처리 상품 수, 단계별 p50/p95, 최대 메모리(RSS, 프로세스 풀 워커는 따로)를 측정
+
+사용 예:
+    python benchmark.py --sizes 50,200,1000
+    python benchmark.py --sizes 200 --json 결과.json
+    python benchmark.py --sizes 200 --baseline 결과.json   # 처리량이 기준보다 20% 이상 떨어지면 종료 코드 1
+"""
+import sys
+import os
+import json
+import re
+import time
+import argparse
+import shutil
+import subprocess
+import tempfile
+import threading
+import multiprocessing
+from io import BytesIO
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+SITE_NAME = "퀄엔드"
+CARDS_PER_PAGE = 40
+
+# (가로, 세로) - 세로 200 미만은 수집기가 버리는 이미지
+IMAGE_SIZES = [(800, 800), (1200, 1600), (640, 480), (300, 150), (120, 120)]
+IMAGES_PER_PRODUCT = 4
+
+CANNED_PRODUCT = {
+    "price": 120000,
+    "market_price": "2500000",
+    "brand": "GUCCI",
+    "first_category": "가방",
+    "second_category": "토트백",
+    "gender": "여성",
+    "colors": ["블랙", "화이트"],
+    "sizes": ["FREE"],
+    "kor_name": "[GUCCI] 벤치마크 상품",
+    "eng_name": "[GUCCI] Benchmark Item",
+    "genuine_number": "123456",
+}
+
+
+def build_images():
+    """
+    크기별 JPEG 바이트. 상품마다 내용 해시가 달라지도록 응답할 때 꼬리에 상품 ID 를 붙인다.
+    """
+    from PIL import Image
+
+    images = []
+    for index, size in enumerate(IMAGE_SIZES):
+        buffer = BytesIO()
+        Image.new('RGB', size, (40 * index, 120, 200)).save(buffer, 'JPEG', quality=80)
+        images.append(buffer.getvalue())
+    return images
+
+
+def category_page(catalog_size, page):
+    last_page = max(1, -(-catalog_size // CARDS_PER_PAGE))
+    start = (page - 1) * CARDS_PER_PAGE
+    cards = []
+    for product_id in range(start, min(start + CARDS_PER_PAGE, catalog_size)):
+        cards.append(
+            f'<div class="col-sm-3"><a href="/shop/item.php?it_id={product_id}">'
+            f'<img src="/data/item/{product_id}_0.jpg"></a><p>상품 {product_id}</p></div>'
+        )
+    pages = "".join(f'<a href="/shop/list.php?ca_id=10&page={n}">{n}</a>' for n in range(1, last_page + 1))
+    return (
+        '<html><head><title>신상품</title><script src="/js/common.js"></script></head><body>'
+        '<div id="hd"><ul class="menu"><li><a href="/">홈</a></li></ul></div>'
+        f'<div class="row">{"".join(cards)}</div><nav class="pg_wrap">{pages}</nav>'
+        '<div id="ft">회사 정보</div></body></html>'
+    )
+
+
+def product_page(product_id):
+    images = "".join(
+        f'<img src="/data/item/{product_id}_{n}.jpg">' for n in range(IMAGES_PER_PRODUCT)
+    )
+    description = "".join(f"<p>상세 설명 문단 {n} - 소재, 사이즈, 배송 안내</p>" for n in range(30))
+    return (
+        f'<html><head><title>[GUCCI] 벤치마크 상품 {product_id}</title>'
+        '<meta property="og:title" content="벤치마크 상품"><script>var g5_url = "/";</script></head><body>'
+        '<div id="hd"><img src="/theme/basic/img/logo.png"><ul class="menu"><li><a href="/">홈</a></li></ul></div>'
+        f'<div id="sct_location">홈 &gt; 가방</div>'
+        f'<form name="fitem"><input type="hidden" name="it_id[]" value="{product_id}">'
+        f'<div id="sit_ov"><h2 id="sit_title">[GUCCI] 벤치마크 상품 {product_id} <span class="sound_only">요약정보 및 구매</span></h2>'
+        '<table class="sit_ov_tbl"><tr><th scope="row">시중가격</th><td>2,500,000원</td></tr>'
+        '<tr><th scope="row">판매가격</th><td><strong>120,000원</strong><input type="hidden" id="it_price" value="120000"></td></tr></table>'
+        '<table><tr><th><label for="it_option_1">색상</label></th><td><select id="it_option_1" class="it_option">'
+        '<option value="">선택</option><option value="블랙,0,9">블랙</option><option value="화이트,0,9">화이트</option>'
+        '</select></td></tr></table></div></form>'
+        f'<div id="sit_inf_explan">{images}{description}<img src="/img/icon_new.png"></div>'
+        '<div id="ft">회사 정보</div></body></html>'
+    )
+
+
+def make_handler(catalog_size, images, page_latency):
+    class FixtureHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            parsed = urlparse(self.path)
+            query = parse_qs(parsed.query)
+
+            if page_latency:
+                time.sleep(page_latency)
+
+            if parsed.path == "/shop/list.php":
+                page = int(query.get('page', ['1'])[0])
+                self._send(category_page(catalog_size, page).encode('utf-8'), "text/html; charset=utf-8")
+            elif parsed.path == "/shop/item.php":
+                self._send(product_page(query['it_id'][0]).encode('utf-8'), "text/html; charset=utf-8")
+            elif parsed.path.startswith("/data/item/"):
+                match = re.match(r"/data/item/(\d+)_(\d+)\.jpg$", parsed.path)
+                if not match:
+                    return self._send(b"", "text/plain", 404)
+                product_id, index = match.groups()
+                body = images[(int(product_id) + int(index)) % len(images)] + product_id.encode()
+                self._send(body, "image/jpeg")
+            else:
+                self._send(b"", "text/plain", 404)
+
+        def _send(self, body, content_type, status=200):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return FixtureHandler
+
+
+def start_fixture_server(catalog_size, page_latency):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(catalog_size, build_images(), page_latency))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeModel:
+    """
+    generate_content 만 흉내내는 가짜 모델. 배치 프롬프트면 url 별 배열을, 아니면 객체 하나를 반환.
+    """
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    def generate_content(self, prompt):
+        time.sleep(self.latency)
+        urls = re.findall(r"```html_data url=(\S+)", prompt)
+        if urls:
+            return FakeResponse(json.dumps([{"url": url, **CANNED_PRODUCT} for url in urls], ensure_ascii=False))
+        return FakeResponse(json.dumps(CANNED_PRODUCT, ensure_ascii=False))
+
+
+def peak_rss_mb(children=False):
+    """
+    :param children: True 면 종료된 자식 프로세스(프로세스 풀 워커) 중 가장 큰 프로세스의 최대 RSS
+    """
+    try:
+        import resource
+    except ImportError:
+        if children:
+            return None
+        try:
+            import psutil
+        except ImportError:
+            return None
+        # Windows: 프로세스 최대 작업 집합
+        return psutil.Process().memory_info().peak_wset / 1024 / 1024
+
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    # Linux 는 KB, macOS 는 byte 단위
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def run_one(options):
+    """
+    자식 프로세스에서 실행: 빈 작업 폴더에서 main() 과 엑셀 저장을 한 번 수행하고 결과를 JSON 으로 출력.
+    """
+    work_dir = tempfile.mkdtemp(prefix="bench_")
+    os.chdir(work_dir)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    import logging
+    import main
+
+    # 상품마다 남기는 INFO 로그가 측정을 방해하지 않도록 콘솔 출력은 경고 이상만
+    for handler in logging.getLogger("ProductScraper").handlers:
+        if isinstance(handler, logging.StreamHandler) and not isinstance(handler, logging.FileHandler):
+            handler.setLevel(logging.WARNING)
+
+    main.config_data = {"api_key": "", "model": "fake", "offline": True}
+    main.model = FakeModel(options.llm_latency)
+    main.batch_model = FakeModel(options.llm_latency)
+    main.category_data = [[SITE_NAME, "신상품", f"{options.base_url}/shop/list.php?ca_id=10"]]
+    # 로컬 서버는 요청 제한이 없으므로 host limiter 상한을 올려 파이프라인 자체를 측정
+    main.HOST_RATE = options.host_rate
+    main.HOST_BURST = max(main.HOST_BURST, int(options.host_rate))
+    main.HOST_MAX_CONCURRENCY = options.host_concurrency
+    main.HOST_INITIAL_CONCURRENCY = options.host_concurrency
+
+    if options.process_pool:
+        # 가짜 모델/설정은 이 프로세스의 main 모듈에만 들어 있으므로 워커가 그대로 물려받도록 fork 로 띄움
+        multiprocessing.set_start_method("fork", force=True)
+
+    main_argv = ["--workers", str(options.workers), "--offline"]
+    if options.no_llm_cache:
+        main_argv.append("--no-llm-cache")
+    if options.llm_batch:
+        main_argv.append("--llm-batch")
+    if options.process_pool:
+        main_argv.append("--process-pool")
+    if options.low_memory:
+        main_argv.append("--low-memory")
+    args = main.parse_args(main_argv)
+
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w', encoding='utf-8')
+    try:
+        started = time.perf_counter()
+        results = main.main(args)
+        run_seconds = time.perf_counter() - started
+        run_peak_rss = peak_rss_mb()
+
+        started = time.perf_counter()
+        if options.low_memory:
+            main.export_results(main.iter_journal_rows(main.timestamp))
+        else:
+            main.export_results(results.values())
+        export_seconds = time.perf_counter() - started
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+    statuses, _ = main.ResultJournal.load_status(main.timestamp)
+    products = len(statuses)
+    success = sum(1 for ok in statuses.values() if ok)
+    summary = main.metrics.summary()["stages"]
+    print(json.dumps({
+        "size": options.size,
+        "products": products,
+        "success": success,
+        "seconds": run_seconds,
+        "products_per_sec": products / run_seconds if run_seconds else 0,
+        "export_seconds": export_seconds,
+        "run_peak_rss_mb": run_peak_rss,
+        "peak_rss_mb": peak_rss_mb(),
+        # 프로세스 풀 워커는 위 값에 포함되지 않으므로 따로 (워커 중 가장 큰 프로세스)
+        "worker_peak_rss_mb": peak_rss_mb(children=True) if options.process_pool else None,
+        "stages": {stage: {"count": s["count"], "p50": s["p50"], "p95": s["p95"]} for stage, s in summary.items()},
+        "work_dir": work_dir,
+    }, ensure_ascii=False))
+
+
+def run_size(options, size):
+    server = start_fixture_server(size, options.page_latency)
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    command = [
+        sys.executable, os.path.abspath(__file__), "--run-one",
+        "--size", str(size), "--base-url", base_url,
+        "--workers", str(options.workers), "--llm-latency", str(options.llm_latency),
+        "--host-rate", str(options.host_rate), "--host-concurrency", str(options.host_concurrency),
+    ]
+    if options.no_llm_cache:
+        command.append("--no-llm-cache")
+    if options.llm_batch:
+        command.append("--llm-batch")
+    if options.process_pool:
+        command.append("--process-pool")
+    if options.low_memory:
+        command.append("--low-memory")
+
+    # 진행 막대는 끄고 경고/오류만 그대로 보여준다
+    env = dict(os.environ, TQDM_DISABLE="1")
+    try:
+        completed = subprocess.run(command, stdout=subprocess.PIPE, text=True, encoding='utf-8', env=env)
+    finally:
+        server.shutdown()
+    if completed.returncode != 0:
+        raise RuntimeError(f"{size}개 벤치마크 실행 실패 (종료 코드 {completed.returncode})")
+
+    report = json.loads(completed.stdout.strip().splitlines()[-1])
+    if not options.keep_work_dir:
+        shutil.rmtree(report.pop('work_dir'), ignore_errors=True)
+    return report
+
+
+def print_report(reports):
+    print(f"\n{'상품 수':>8}{'성공':>8}{'상품/초':>10}{'실행(초)':>10}{'엑셀(초)':>10}{'최대 RSS(MB)':>14}{'워커 RSS(MB)':>14}")
+    for report in reports:
+        rss = f"{report['peak_rss_mb']:.0f}" if report['peak_rss_mb'] is not None else "-"
+        worker_rss = report.get('worker_peak_rss_mb')
+        worker_rss = f"{worker_rss:.0f}" if worker_rss is not None else "-"
+        print(
+            f"{report['products']:>8}{report['success']:>8}{report['products_per_sec']:>10.2f}"
+            f"{report['seconds']:>10.1f}{report['export_seconds']:>10.1f}{rss:>14}{worker_rss:>14}"
+        )
+
+    stages = sorted({stage for report in reports for stage in report['stages']})
+    print(f"\n{'단계 (p50 / p95 초)':<24}" + "".join(f"{report['size']:>20}" for report in reports))
+    for stage in stages:
+        cells = []
+        for report in reports:
+            s = report['stages'].get(stage)
+            cells.append(f"{s['p50']:.3f} / {s['p95']:.3f}" if s else "-")
+        print(f"{stage:<24}" + "".join(f"{cell:>20}" for cell in cells))
+
+
+def compare_with_baseline(reports, baseline_path, tolerance):
+    """
+    크기별 초당 처리 상품 수가 기준보다 tolerance 이상 떨어졌는지 확인.
+    :return: 회귀가 있으면 False
+    """
+    with open(baseline_path, 'r', encoding='utf-8') as file:
+        baseline = {report['size']: report for report in json.load(file)}
+
+    ok = True
+    for report in reports:
+        base = baseline.get(report['size'])
+        if base is None:
+            continue
+        ratio = report['products_per_sec'] / base['products_per_sec'] if base['products_per_sec'] else 1
+        status = "OK" if ratio >= 1 - tolerance else "회귀"
+        print(f"[{status}] {report['size']}개: {base['products_per_sec']:.2f} → {report['products_per_sec']:.2f} 상품/초 ({ratio:.0%})")
+        ok = ok and ratio >= 1 - tolerance
+    return ok
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="수집기 처리량 벤치마크")
+    parser.add_argument("--sizes", default="50,200,1000",
+                        help="측정할 카탈로그 크기 목록 (쉼표 구분, 기본 50,200,1000)")
+    parser.add_argument("--workers", type=int, default=4, help="main 의 --workers (기본 4)")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="가짜 모델 응답 지연(초, 기본 0.5)")
+    parser.add_argument("--page-latency", type=float, default=0.02, help="로컬 서버 응답 지연(초, 기본 0.02)")
+    parser.add_argument("--host-rate", type=float, default=1000.0,
+                        help="host limiter 초당 요청 상한 (기본 1000, 실제 값으로 측정하려면 4)")
+    parser.add_argument("--host-concurrency", type=int, default=32, help="host limiter 동시 요청 상한 (기본 32)")
+    parser.add_argument("--no-llm-cache", action="store_true",
+                        help="main 의 --no-llm-cache 로 실행 (기본은 캐시 사용, 작업 폴더가 매번 새로 만들어져 캐시는 비어 있음)")
+    parser.add_argument("--llm-batch", action="store_true", help="main 의 --llm-batch 로 실행")
+    parser.add_argument("--process-pool", action="store_true", help="main 의 --process-pool 로 실행")
+    parser.add_argument("--low-memory", action="store_true", help="main 의 --low-memory 로 실행")
+    parser.add_argument("--keep-work-dir", action="store_true",
+                        help="측정에 쓴 임시 작업 폴더(엑셀, 이미지, 로그)를 지우지 않음")
+    parser.add_argument("--json", default=None, help="결과를 저장할 JSON 파일 경로 (이후 --baseline 으로 사용)")
+    parser.add_argument("--baseline", default=None, help="비교할 이전 결과 JSON 파일")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="허용하는 처리량 감소 비율 (기본 0.2)")
+    # 내부용: 크기 하나를 자식 프로세스에서 실행
+    parser.add_argument("--run-one", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--size", type=int, default=0, help=argparse.SUPPRESS)
+    parser.add_argument("--base-url", default="", help=argparse.SUPPRESS)
+    options = parser.parse_args(argv)
+    if options.llm_batch and options.process_pool:
+        parser.error("--llm-batch 는 --process-pool 과 함께 쓸 수 없습니다")
+    if options.process_pool and "fork" not in multiprocessing.get_all_start_methods():
+        # spawn 워커는 main 을 새로 import 하므로 가짜 모델 대신 실제 config.json 을 찾음
+        parser.error("fork 를 지원하지 않는 환경(Windows)에서는 --process-pool 을 측정할 수 없습니다")
+    return options
+
+
+if __name__ == "__main__":
+    options = parse_args()
+
+    if options.run_one:
+        run_one(options)
+        sys.exit(0)
+
+    reports = []
+    for size in [int(value) for value in options.sizes.split(",") if value.strip()]:
+        print(f"{size}개 카탈로그 측정 중...", flush=True)
+        reports.append(run_size(options, size))
+
+    print_report(reports)
+
+    if options.json:
+        with open(options.json, 'w', encoding='utf-8') as file:
+            json.dump(reports, file, ensure_ascii=False, indent=2)
+
+    if options.baseline and not compare_with_baseline(reports, options.baseline, options.tolerance):
+        sys.exit(1)
@@ -1,28 +1,33 @@
 import sys
 import os
 import requests
+from requests.adapters import HTTPAdapter
 import json
 import re
+import math
+import hashlib
+import sqlite3
+import zlib
+import shutil
 import time  # 추가된 부분
+import random
+import socket
+import queue
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, Future, as_completed
+import multiprocessing
+import multiprocessing.util
+import argparse
 from bs4 import BeautifulSoup
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from webdriver_manager.chrome import ChromeDriverManager
-from urllib.parse import urljoin, urlparse
-import google.generativeai as genai
+from bs4.element import Tag, NavigableString, Comment, Declaration, Doctype, ProcessingInstruction, CData
+import html as html_lib
+from urllib.parse import urljoin, urlparse, parse_qs, urlencode, urlunparse
 from datetime import datetime
-import pandas as pd
-import openpyxl
-from openpyxl.utils.dataframe import dataframe_to_rows
-from openpyxl.styles import Alignment, Font
-from PIL import Image
 from io import BytesIO
 from tqdm import tqdm
-from openpyxl.drawing.image import Image as OpenpyxlImage
+# selenium, webdriver_manager, google.generativeai, pandas, openpyxl, PIL 은 무거우므로
+# 실제로 쓰는 함수 안에서 import 한다 (시작 속도 / 프로세스 풀 워커 생성 속도)
 
 import logging
 from logging.handlers import RotatingFileHandler
@@ -65,6 +70,197 @@ def setup_logging():
 logger = setup_logging()
 
 
+METRICS_LOG_PATH = "metrics.jsonl"
+
+
+def setup_metrics_logger():
+    """
+    단계별 소요 시간 이벤트를 JSON 한 줄씩 기록하는 로거 (콘솔/scraper.log 에는 남기지 않음).
+    """
+    metrics_logger = logging.getLogger("ProductScraper.metrics")
+    if metrics_logger.handlers:
+        return metrics_logger
+
+    metrics_logger.setLevel(logging.INFO)
+    metrics_logger.propagate = False
+    handler = RotatingFileHandler(
+        METRICS_LOG_PATH, maxBytes=20 * 1024 * 1024, backupCount=3, encoding='utf-8', delay=True
+    )
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    metrics_logger.addHandler(handler)
+    return metrics_logger
+
+
+metrics_logger = setup_metrics_logger()
+
+
+def percentile(values, q):
+    """
+    nearest-rank 방식 백분위수.
+    """
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+METRICS_MAX_SAMPLES = 5000  # 항목별로 보관하는 샘플 수 상한 (넘으면 reservoir sampling)
+
+
+class MetricSeries:
+    """
+    항목 하나의 소요 시간 통계. 횟수/합계/최대는 정확히, 백분위수는 최대 METRICS_MAX_SAMPLES 개의
+    표본으로 계산하므로 상품 수가 많아도 메모리가 늘지 않는다.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = []
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        if len(self.samples) < METRICS_MAX_SAMPLES:
+            self.samples.append(seconds)
+        else:
+            index = random.randrange(self.count)
+            if index < METRICS_MAX_SAMPLES:
+                self.samples[index] = seconds
+
+    def merge(self, other):
+        count = self.count
+        for value in other.samples:
+            self.add(value)
+        # 표본 외의 횟수/합계/최대는 그대로 더함
+        self.count = count + other.count
+        self.total += other.total - sum(other.samples)
+        self.max = max(self.max, other.max)
+
+    def stats(self):
+        return {
+            "count": self.count,
+            "total": self.total,
+            "p50": percentile(self.samples, 50),
+            "p95": percentile(self.samples, 95),
+            "max": self.max,
+        }
+
+
+class RunMetrics:
+    """
+    단계별 소요 시간을 JSON 이벤트로 기록하고, 실행이 끝나면 단계/사이트별 p50/p95 를 요약.
+    프로세스 풀 워커의 샘플은 drain() 으로 꺼내 부모 프로세스에서 merge() 한다.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._samples = {}  # (단계, 사이트) → MetricSeries
+
+    def record(self, stage, seconds, site="", **fields):
+        with self._lock:
+            if (stage, site) not in self._samples:
+                self._samples[(stage, site)] = MetricSeries()
+            self._samples[(stage, site)].add(seconds)
+        event = {"ts": round(time.time(), 3), "stage": stage, "site": site, "seconds": round(seconds, 4), **fields}
+        metrics_logger.info(json.dumps(event, ensure_ascii=False))
+
+    @contextmanager
+    def timer(self, stage, site="", **fields):
+        """
+        with 블록의 소요 시간을 기록. 블록 안에서 넘겨받은 dict 에 값을 추가하면 이벤트에 함께 남는다.
+        예외가 나면 ok=False 로 기록하고 그대로 올린다.
+        """
+        fields['ok'] = True
+        start = time.perf_counter()
+        try:
+            yield fields
+        except BaseException:
+            fields['ok'] = False
+            raise
+        finally:
+            self.record(stage, time.perf_counter() - start, site, **fields)
+
+    def drain(self):
+        with self._lock:
+            samples, self._samples = self._samples, {}
+        return samples
+
+    def merge(self, samples):
+        with self._lock:
+            for key, series in samples.items():
+                self._samples.setdefault(key, MetricSeries()).merge(series)
+
+    def summary(self):
+        """
+        :return: {'stages': {단계: 통계}, 'sites': {(단계, 사이트): 통계}, 'series': {(단계, 사이트): 통계}}
+                 sites 는 사이트가 있는 항목만, series 는 사이트 없는 항목까지 모두 포함.
+                 통계는 count, total, p50, p95, max (초)
+        """
+        with self._lock:
+            by_stage = {}
+            for (stage, _), values in self._samples.items():
+                by_stage.setdefault(stage, MetricSeries()).merge(values)
+            series = {key: values.stats() for key, values in sorted(self._samples.items())}
+        return {
+            "stages": {stage: values.stats() for stage, values in sorted(by_stage.items())},
+            "sites": {key: value for key, value in series.items() if key[1]},
+            "series": series,
+        }
+
+    def format_summary(self):
+        summary = self.summary()
+        lines = [f"{'단계':<24}{'사이트':<12}{'횟수':>8}{'p50':>10}{'p95':>10}{'최대':>10}{'합계':>10}"]
+
+        def add_line(stage, site, s):
+            lines.append(
+                f"{stage:<24}{site:<12}{s['count']:>8}{s['p50']:>10.3f}{s['p95']:>10.3f}{s['max']:>10.3f}{s['total']:>10.1f}"
+            )
+
+        for stage, s in summary["stages"].items():
+            add_line(stage, "전체", s)
+        for (stage, site), s in summary["sites"].items():
+            add_line(stage, site, s)
+        return "\n".join(lines)
+
+    def write_prometheus(self, path):
+        """
+        Prometheus 텍스트 형식(node_exporter textfile collector 용)으로 요약을 기록.
+        """
+        def label(value):
+            return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+        lines = [
+            "# HELP scraper_stage_seconds Time spent per scraper stage.",
+            "# TYPE scraper_stage_seconds summary",
+        ]
+        for (stage, site), s in self.summary()["series"].items():
+            labels = f'stage="{label(stage)}",site="{label(site)}"'
+            lines.append(f'scraper_stage_seconds{{{labels},quantile="0.5"}} {s["p50"]:.6f}')
+            lines.append(f'scraper_stage_seconds{{{labels},quantile="0.95"}} {s["p95"]:.6f}')
+            lines.append(f'scraper_stage_seconds_sum{{{labels}}} {s["total"]:.6f}')
+            lines.append(f'scraper_stage_seconds_count{{{labels}}} {s["count"]}')
+
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            file.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, path)
+
+    def report(self, prometheus_path=None):
+        """
+        실행 종료 시 요약을 로그로 남기고, 경로가 주어지면 Prometheus 파일도 기록.
+        """
+        if not self._samples:
+            return
+        logger.info("단계별 소요 시간 (초)\n" + self.format_summary())
+        if prometheus_path:
+            self.write_prometheus(prometheus_path)
+            logger.info(f"메트릭 파일 저장: {prometheus_path}")
+
+
+metrics = RunMetrics()
+
+
 
 def get_resource_path(relative_path):
     """PyInstaller 빌드 환경에서 리소스 파일 경로를 반환."""
@@ -80,39 +276,256 @@ category_urls_path = get_resource_path("category_urls.txt")
 
 
 
-# 설정 파일 로드
-with open(config_path, 'r', encoding='utf-8') as file:
-    config_data = json.load(file)
-    api_key = config_data['api_key']
-    model_name = config_data['model']
-
-genai.configure(api_key=api_key)
-model = genai.GenerativeModel(
-    model_name=model_name,
-    generation_config={
-        "temperature": 0,
-        "top_p": 0.95,
-        "top_k": 64,
-        "max_output_tokens": 500,
-        "response_mime_type": "application/json",
-    }
-)
+config_data = None
+_config_lock = threading.Lock()
 
-# 카테고리 URL 읽기
-with open(category_urls_path, 'r', encoding='utf-8') as file:
-    category_data = [line.strip().split('|') for line in file.readlines()]
+
+def get_config():
+    """
+    config.json 을 처음 필요할 때 한 번만 읽는다.
+    """
+    global config_data
+    with _config_lock:
+        if config_data is None:
+            with open(config_path, 'r', encoding='utf-8') as file:
+                config_data = json.load(file)
+        return config_data
+
+
+# 모델은 처음 LLM 을 호출할 때 생성. 외부에서 미리 대입하면 그 객체를 그대로 사용한다.
+model = None
+# 여러 상품을 한 번에 처리하는 배치 요청용 (응답이 길어 출력 토큰 한도만 다름)
+batch_model = None
+_model_lock = threading.Lock()
+_genai_configured = False
+
+
+def create_model(max_output_tokens):
+    global _genai_configured
+    import google.generativeai as genai
+
+    config = get_config()
+    if not _genai_configured:
+        genai.configure(api_key=config['api_key'])
+        _genai_configured = True
+    return genai.GenerativeModel(
+        model_name=config['model'],
+        generation_config={
+            "temperature": 0,
+            "top_p": 0.95,
+            "top_k": 64,
+            "max_output_tokens": max_output_tokens,
+            "response_mime_type": "application/json",
+        }
+    )
+
+
+def get_model():
+    global model
+    with _model_lock:
+        if model is None:
+            model = create_model(max_output_tokens=500)
+        return model
+
+
+def get_batch_model():
+    global batch_model
+    with _model_lock:
+        if batch_model is None:
+            batch_model = create_model(max_output_tokens=8192)
+        return batch_model
+
+
+category_data = None
+
+
+def get_category_data():
+    """
+    카테고리 URL 목록 (사이트명|카테고리명|URL) 을 읽는다.
+    """
+    global category_data
+    if category_data is None:
+        with open(category_urls_path, 'r', encoding='utf-8') as file:
+            category_data = [line.strip().split('|') for line in file.readlines()]
+    return category_data
 
 results = {}
 timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
 
-def setup_driver():
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/107.0.0.0 Safari/537.36"
+
+# 사이트별 수집 규칙
+# - needs_js: True 이면 HTTP 요청 없이 바로 브라우저로 로드
+# - *_markers: 정상 페이지라면 반드시 존재해야 하는 CSS selector 목록 (하나라도 없으면 브라우저로 재시도)
+# - ready_selectors: 브라우저 로드 시 이 selector 가 나타나면 로드 완료로 본다 (없으면 document.readyState)
+SITE_RULES = {
+    '퀄엔드': {
+        'needs_js': False,
+        'category_markers': ['div.col-sm-3 a[href*="it_id"]'],
+        'product_markers': ['input[name="it_id[]"]', 'img'],
+        'ready_selectors': {
+            'category': 'div.col-sm-3 a[href*="it_id"]',
+            'product': 'form[name="fitem"]',
+        },
+        # 상품명/가격/옵션/경로/상세설명 영역 (영카트 상품 페이지 구조)
+        'reduce_selectors': [
+            '#sct_location', '#sit_title', '#sit_desc', '.sit_ov_tbl',
+            '#sit_ov', '#sit_opt_info', 'select.it_option', '#sit_inf_explan',
+        ],
+        # 규칙 기반 추출: 필드별 (selector, 속성) 후보. 속성이 None 이면 텍스트 사용
+        'extract': {
+            'price': [
+                ('input#it_price', 'value'),
+                ('meta[property="product:price:amount"]', 'content'),
+                ('.sit_ov_tbl th:-soup-contains("판매가격") + td', None),
+            ],
+            'market_price': [
+                ('.sit_ov_tbl th:-soup-contains("시중가격") + td', None),
+            ],
+            'kor_name': [
+                ('#sit_title', None),
+            ],
+            'options': 'select.it_option',
+            'option_form': 'form[name="fitem"]',
+        },
+    },
+}
+
+DEFAULT_SITE_RULE = {
+    'needs_js': True,
+    'category_markers': [],
+    'product_markers': [],
+    'ready_selectors': {},
+    'reduce_selectors': [],
+    'extract': {},
+}
+
+
+def get_site_rule(site_name):
+    """
+    사이트 이름에 해당하는 수집 규칙 반환. 등록되지 않은 사이트는 브라우저 전용.
+    """
+    for key, rule in SITE_RULES.items():
+        if key in site_name:
+            return {**DEFAULT_SITE_RULE, **rule}
+    return dict(DEFAULT_SITE_RULE)
+
+# 가벼운 브라우저 모드: headless + eager 로드 + 이미지/미디어/폰트/트래커 차단
+# 이미지는 requests 로 따로 받으므로 브라우저가 받을 필요가 없다
+LEAN_BROWSER = True
+
+BLOCKED_URL_PATTERNS = [
+    # 이미지
+    "*.jpg", "*.jpeg", "*.png", "*.gif", "*.webp", "*.bmp", "*.svg", "*.ico",
+    # 미디어
+    "*.mp4", "*.webm", "*.mp3", "*.m4a", "*.ogg",
+    # 폰트
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot",
+    # 트래커
+    "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*",
+    "*connect.facebook.net*", "*wcs.naver.net*", "*analytics.naver.com*",
+    "*t1.daumcdn.net/kas*", "*criteo.*", "*hotjar.com*",
+]
+
+
+CHROMEDRIVER_CACHE_PATH = "chromedriver_cache.json"
+CHROMEDRIVER_CACHE_MAX_AGE = 7 * 24 * 60 * 60  # 버전 고정이 없으면 일주일마다 최신 버전 확인
+CHROMEDRIVER_OFFLINE = False
+
+_chromedriver_path = None
+_chromedriver_lock = threading.Lock()
+
+
+def _read_chromedriver_cache():
+    try:
+        with open(CHROMEDRIVER_CACHE_PATH, 'r', encoding='utf-8') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_chromedriver_cache(path, version):
+    tmp_path = CHROMEDRIVER_CACHE_PATH + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as file:
+        json.dump({"path": path, "version": version or "", "resolved_at": time.time()}, file, ensure_ascii=False)
+    os.replace(tmp_path, CHROMEDRIVER_CACHE_PATH)
+
+
+def invalidate_chromedriver_cache():
+    global _chromedriver_path
+    with _chromedriver_lock:
+        _chromedriver_path = None
+        try:
+            os.remove(CHROMEDRIVER_CACHE_PATH)
+        except OSError:
+            pass
+
+
+def resolve_chromedriver():
+    """
+    chromedriver 경로를 프로세스당 한 번만 결정한다.
+    1) config 의 chromedriver_path 가 있으면 그대로 사용
+    2) 디스크 캐시의 경로가 존재하고 버전(chromedriver_version)이 맞으면 네트워크 없이 사용
+    3) 오프라인이 아니면 webdriver_manager 로 받은 뒤 캐시에 기록
+    4) 오프라인이면 PATH 의 chromedriver 를 사용
+    """
+    global _chromedriver_path
+    with _chromedriver_lock:
+        if _chromedriver_path is not None:
+            return _chromedriver_path
+
+        config = get_config()
+        if config.get('chromedriver_path'):
+            _chromedriver_path = config['chromedriver_path']
+            return _chromedriver_path
+
+        version = config.get('chromedriver_version') or ""
+        offline = CHROMEDRIVER_OFFLINE or config.get('offline', False)
+
+        cached = _read_chromedriver_cache()
+        if cached.get('path') and os.path.exists(cached['path']) and cached.get('version', "") == version:
+            fresh = version or time.time() - cached.get('resolved_at', 0) < CHROMEDRIVER_CACHE_MAX_AGE
+            if fresh or offline:
+                _chromedriver_path = cached['path']
+                return _chromedriver_path
+
+        if offline:
+            path = cached.get('path') if cached.get('path') and os.path.exists(cached['path']) else shutil.which("chromedriver")
+            if path is None:
+                raise RuntimeError("오프라인 모드인데 캐시된 chromedriver 도 PATH 의 chromedriver 도 없습니다.")
+            _chromedriver_path = path
+            return _chromedriver_path
+
+        from webdriver_manager.chrome import ChromeDriverManager
+        path = ChromeDriverManager(driver_version=version or None).install()
+        _write_chromedriver_cache(path, version)
+        logger.info(f"chromedriver 경로 캐시: {path}")
+        _chromedriver_path = path
+        return _chromedriver_path
+
+
+def setup_driver(lean=None):
+    if lean is None:
+        lean = LEAN_BROWSER
+
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+    from selenium.webdriver.chrome.options import Options
+
     chrome_options = Options()
-    # chrome_options.add_argument("--headless=new")  # 최신 Headless 모드
+    if lean:
+        chrome_options.add_argument("--headless=new")  # 최신 Headless 모드
+        chrome_options.add_argument("--window-size=1920,1080")
+        chrome_options.add_argument("--blink-settings=imagesEnabled=false")
+        chrome_options.add_argument("--mute-audio")
+        # DOMContentLoaded 까지만 기다리고 이미지/서브리소스는 기다리지 않음
+        chrome_options.page_load_strategy = 'eager'
+    else:
+        chrome_options.add_argument("--start-maximized")
     chrome_options.add_argument("--disable-gpu")
     chrome_options.add_argument("--no-sandbox")
     chrome_options.add_argument("--disable-dev-shm-usage")
     chrome_options.add_argument("--disable-extensions")
-    chrome_options.add_argument("--start-maximized")
     chrome_options.add_argument("--disable-blink-features=AutomationControlled")
     chrome_options.add_argument("--disable-infobars")
     chrome_options.add_argument("--ignore-certificate-errors")  # SSL 인증 무시
@@ -127,73 +540,683 @@ def setup_driver():
 
 
     # User-Agent 설정
-    chrome_options.add_argument(
-        "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/107.0.0.0 Safari/537.36"
-    )
+    chrome_options.add_argument(f"user-agent={USER_AGENT}")
 
-    service = Service(ChromeDriverManager().install())
-    driver = webdriver.Chrome(service=service, options=chrome_options)
+    try:
+        driver = webdriver.Chrome(service=Service(resolve_chromedriver()), options=chrome_options)
+    except Exception as e:
+        # 크롬이 업데이트되어 캐시된 드라이버 버전이 맞지 않는 경우 한 번만 다시 받는다
+        if CHROMEDRIVER_OFFLINE or "session not created" not in str(e).lower():
+            raise
+        logger.warning(f"캐시된 chromedriver 로 실행 실패, 다시 확인합니다: {e}")
+        invalidate_chromedriver_cache()
+        driver = webdriver.Chrome(service=Service(resolve_chromedriver()), options=chrome_options)
+
+    if lean:
+        try:
+            driver.execute_cdp_cmd("Network.enable", {})
+            driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URL_PATTERNS})
+        except Exception as e:
+            logger.warning(f"리소스 차단 설정 실패, 차단 없이 진행: {e}")
     return driver
 
+
+class DriverPool:
+    """
+    워밍된 Chrome 인스턴스를 워커에게 빌려주는 크기 제한 풀.
+    - 반납 시 쿠키/탭/스토리지를 초기화
+    - max_pages 회 사용했거나 초기화에 실패(크래시)한 드라이버는 폐기 후 새로 생성
+    """
+
+    def __init__(self, max_size=1, max_pages=50):
+        self.max_size = max_size
+        self.max_pages = max_pages
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self._page_counts = {}
+        self._closed = False
+
+    @contextmanager
+    def lease(self, site_name=""):
+        """
+        드라이버 하나를 빌려 with 블록 동안 사용.
+        :param site_name: 새 드라이버를 띄울 때 소요 시간을 기록할 사이트
+        """
+        if self._closed:
+            raise RuntimeError("DriverPool이 이미 종료되었습니다.")
+
+        self._slots.acquire()
+        driver = None
+        try:
+            driver = self._checkout(site_name)
+            yield driver
+        finally:
+            if driver is not None:
+                self._checkin(driver)
+            self._slots.release()
+
+    def _checkout(self, site_name=""):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with metrics.timer("driver_launch", site_name):
+            driver = setup_driver()
+        with self._lock:
+            self._page_counts[id(driver)] = 0
+        logger.debug("새 드라이버 생성")
+        return driver
+
+    def _checkin(self, driver):
+        with self._lock:
+            self._page_counts[id(driver)] = self._page_counts.get(id(driver), 0) + 1
+            used = self._page_counts[id(driver)]
+
+        if self._closed or used >= self.max_pages:
+            logger.debug(f"드라이버 재활용: {used}회 사용")
+            self._discard(driver)
+            return
+
+        try:
+            self._reset(driver)
+        except Exception as e:
+            # 세션이 죽었거나 브라우저가 크래시된 경우
+            logger.warning(f"드라이버 초기화 실패, 폐기합니다: {e}")
+            self._discard(driver)
+            return
+
+        self._idle.put(driver)
+
+    def _reset(self, driver):
+        """
+        다음 임대 전에 브라우저 상태를 초기화.
+        """
+        handles = driver.window_handles
+        for handle in handles[1:]:
+            driver.switch_to.window(handle)
+            driver.close()
+        driver.switch_to.window(handles[0])
+
+        try:
+            driver.execute_script("window.localStorage.clear(); window.sessionStorage.clear();")
+        except Exception:
+            pass  # about:blank 등 스토리지 접근이 불가능한 페이지
+
+        driver.delete_all_cookies()
+        driver.get("about:blank")
+
+    def _discard(self, driver):
+        with self._lock:
+            self._page_counts.pop(id(driver), None)
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    def shutdown(self):
+        """
+        유휴 드라이버를 모두 종료. 임대 중인 드라이버는 반납 시 종료된다.
+        """
+        self._closed = True
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(driver)
+
+
+driver_pool = None
+
+
+def get_driver_pool():
+    global driver_pool
+    if driver_pool is None:
+        driver_pool = DriverPool()
+    return driver_pool
+
+
+def shutdown_driver_pool():
+    global driver_pool
+    if driver_pool is not None:
+        driver_pool.shutdown()
+        driver_pool = None
+
+MIN_IMAGE_HEIGHT = 200
+
+
 def is_valid_image(img_content):
+    from PIL import Image
+
     try:
         img = Image.open(BytesIO(img_content))
         img.verify()
-        if img.height < 200:
+        if img.height < MIN_IMAGE_HEIGHT:
             return False
         return True
     except (IOError, SyntaxError):
         return False
 
 
-def wait_for_page_load(driver, timeout=30):
+# JPEG SOF 마커 (이미지 크기가 들어있는 프레임 헤더)
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def _probe_jpeg_size(data):
+    index = 2
+    while index + 9 <= len(data):
+        if data[index] != 0xFF:
+            return None
+        marker = data[index + 1]
+        if marker == 0xFF:  # 채움 바이트
+            index += 1
+            continue
+        if marker in (0x01, 0xD8) or 0xD0 <= marker <= 0xD7:  # 길이 없는 마커
+            index += 2
+            continue
+        if marker in JPEG_SOF_MARKERS:
+            height = int.from_bytes(data[index + 5:index + 7], 'big')
+            width = int.from_bytes(data[index + 7:index + 9], 'big')
+            return width, height
+        index += 2 + int.from_bytes(data[index + 2:index + 4], 'big')
+    return None
+
+
+def _probe_webp_size(data):
+    chunk = data[12:16]
+    if chunk == b'VP8 ' and len(data) >= 30 and data[23:26] == b'\x9d\x01\x2a':
+        width = int.from_bytes(data[26:28], 'little') & 0x3FFF
+        height = int.from_bytes(data[28:30], 'little') & 0x3FFF
+        return width, height
+    if chunk == b'VP8L' and len(data) >= 25 and data[20] == 0x2F:
+        b0, b1, b2, b3 = data[21:25]
+        width = 1 + (((b1 & 0x3F) << 8) | b0)
+        height = 1 + (((b3 & 0x0F) << 10) | (b2 << 2) | ((b1 & 0xC0) >> 6))
+        return width, height
+    if chunk == b'VP8X' and len(data) >= 30:
+        width = 1 + int.from_bytes(data[24:27], 'little')
+        height = 1 + int.from_bytes(data[27:30], 'little')
+        return width, height
+    return None
+
+
+def probe_image_size(data):
     """
-    JavaScript 실행을 통해 페이지 로드 완료 상태를 확인.
+    이미지 앞부분 바이트만으로 (width, height) 를 읽는다 (JPEG/PNG/GIF/WebP).
+    형식을 모르거나 아직 헤더가 다 오지 않았으면 None.
     """
-    try:
-        WebDriverWait(driver, timeout).until(
-            lambda d: d.execute_script("return document.readyState") == "complete"
+    if data[:2] == b'\xff\xd8':
+        return _probe_jpeg_size(data)
+    if data[:8] == b'\x89PNG\r\n\x1a\n' and len(data) >= 24:
+        return int.from_bytes(data[16:20], 'big'), int.from_bytes(data[20:24], 'big')
+    if data[:6] in (b'GIF87a', b'GIF89a') and len(data) >= 10:
+        return int.from_bytes(data[6:8], 'little'), int.from_bytes(data[8:10], 'little')
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return _probe_webp_size(data)
+    return None
+
+
+def wait_for_page_load(driver, timeout=30, ready_selector=None):
+    """
+    페이지 로드 완료 상태를 확인.
+    ready_selector 가 있으면 해당 요소(또는 "접속할 수 없음" 문구)가 나타날 때까지만 기다리고,
+    없으면 document.readyState 를 확인한다 (eager 모드에서는 interactive 도 완료로 봄).
+    """
+    from selenium.webdriver.support.ui import WebDriverWait
+
+    if ready_selector:
+        condition = lambda d: d.execute_script(
+            "return !!document.querySelector(arguments[0]) || "
+            "(!!document.body && document.body.innerText.indexOf(arguments[1]) >= 0);",
+            ready_selector, BLOCKED_PAGE_TEXT,
         )
+    else:
+        ready_states = ("interactive", "complete") if LEAN_BROWSER else ("complete",)
+        condition = lambda d: d.execute_script("return document.readyState") in ready_states
+
+    try:
+        WebDriverWait(driver, timeout).until(condition)
         print("페이지 로드 완료.")
     except Exception as e:
         raise Exception(f"페이지 로드 시간 초과: {e}")
 
-def load_page_with_stability(driver, url, max_retries=5, wait_time=10):
+BLOCKED_PAGE_TEXT = "접속할 수 없음"
+THROTTLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+HOST_RATE = 4.0               # 호스트당 초당 요청 수 (시작값이자 상한)
+HOST_MIN_RATE = 0.2
+HOST_BURST = 8
+HOST_INITIAL_CONCURRENCY = 4
+HOST_MAX_CONCURRENCY = 8
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+
+
+def backoff_delay(failures, base=BACKOFF_BASE, cap=BACKOFF_MAX):
+    """
+    연속 실패 횟수에 따른 지수 백오프 (equal jitter).
+    """
+    delay = min(cap, base * (2 ** max(0, failures - 1)))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def parse_retry_after(response):
+    """
+    Retry-After 헤더(초 단위)를 읽는다. 없거나 날짜 형식이면 None.
+    """
+    value = response.headers.get("Retry-After", "").strip()
+    if value.isdigit():
+        return min(BACKOFF_MAX, float(value))
+    return None
+
+
+class HostLimiter:
+    """
+    호스트 하나에 대한 요청 속도/동시성 제한.
+    - 토큰 버킷으로 초당 요청 수를 제한
+    - 동시 요청 수는 AIMD: 성공하면 조금씩 늘리고, 차단(429/5xx/접속할 수 없음)되면 절반으로 줄임
+    - 차단되면 지수 백오프 + jitter 동안 이 호스트로의 모든 요청을 멈춤
+    페이지 로드(HTTP/브라우저), 카테고리 페이지, 이미지 다운로드가 모두 같은 인스턴스를 공유한다.
+    """
+
+    def __init__(self, host, rate=None, burst=None, concurrency=None, max_concurrency=None):
+        self.host = host
+        self.max_rate = rate or HOST_RATE
+        self.rate = self.max_rate
+        self.burst = burst or HOST_BURST
+        self.max_concurrency = max_concurrency or HOST_MAX_CONCURRENCY
+        self.limit = float(min(concurrency or HOST_INITIAL_CONCURRENCY, self.max_concurrency))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._active = 0
+        self._failures = 0
+        self._blocked_until = 0.0
+        self._cond = threading.Condition()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self._blocked_until:
+                    wait = self._blocked_until - now
+                elif self._active >= int(self.limit):
+                    wait = None  # release() 가 깨워줌
+                elif self._tokens < 1:
+                    wait = (1 - self._tokens) / self.rate
+                else:
+                    self._tokens -= 1
+                    self._active += 1
+                    return
+                self._cond.wait(wait)
+
+    def release(self):
+        with self._cond:
+            self._active -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self):
+        self.acquire()
+        try:
+            yield self
+        finally:
+            self.release()
+
+    def record_success(self):
+        with self._cond:
+            self._failures = 0
+            self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+            self._cond.notify_all()
+
+    def record_throttle(self, retry_after=None):
+        """
+        차단 응답을 기록하고 백오프 시간(초)을 반환.
+        """
+        with self._cond:
+            self._failures += 1
+            self.limit = max(1.0, self.limit / 2)
+            self.rate = max(HOST_MIN_RATE, self.rate / 2)
+            delay = retry_after if retry_after is not None else backoff_delay(self._failures)
+            self._blocked_until = max(self._blocked_until, time.monotonic() + delay)
+        logger.info(f"{self.host} 요청 제한 감지: {delay:.1f}초 대기, 동시 {int(self.limit)}개, 초당 {self.rate:.2f}회")
+        return delay
+
+
+_host_limiters = {}
+_host_limiters_lock = threading.Lock()
+
+
+def get_host_limiter(url):
+    """
+    URL 의 호스트에 해당하는 공용 HostLimiter 반환.
+    """
+    host = urlparse(url).netloc
+    with _host_limiters_lock:
+        if host not in _host_limiters:
+            _host_limiters[host] = HostLimiter(host)
+        return _host_limiters[host]
+
+
+def load_page_with_stability(driver, url, max_retries=5, ready_selector=None):
     """
     페이지 로드의 안정성을 높이는 최종 로직.
+    "접속할 수 없음" 페이지는 요청 제한 신호로 보고 호스트 limiter 에 기록해 limiter 의 백오프 뒤 다시 시도한다.
+    타임아웃이나 WebDriver 오류는 사이트의 제한과 무관하므로 limiter 를 줄이지 않고 백오프만 한다.
     """
+    limiter = get_host_limiter(url)
     retries = 0
 
     while retries < max_retries:
         try:
             print(f"URL 로드 시도 {retries + 1}: {url}")
-            driver.get(url)
-            
-            # 페이지 로드 완료 상태 확인
-            wait_for_page_load(driver)
-
-            # "접속할 수 없음" 메시지 감지
-            if "접속할 수 없음" in driver.page_source:
-                raise Exception("접속할 수 없음 메시지 감지.")
-
-            print("페이지가 정상적으로 로드되었습니다.")
-            return driver.page_source
+            with limiter.slot():
+                driver.get(url)
 
+                # 페이지 로드 완료 상태 확인
+                wait_for_page_load(driver, ready_selector=ready_selector)
+            page_source = driver.page_source
         except Exception as e:
             print(f"페이지 로드 실패: {e}")
             retries += 1
-            time.sleep(wait_time)
-            print("새로고침 시도...")
-            driver.refresh()
+            if retries < max_retries:
+                time.sleep(backoff_delay(retries))
+            continue
+
+        # "접속할 수 없음" 메시지 감지
+        if BLOCKED_PAGE_TEXT in page_source:
+            print("페이지 로드 실패: 접속할 수 없음 메시지 감지.")
+            retries += 1
+            limiter.record_throttle()
+            continue
+
+        limiter.record_success()
+        print("페이지가 정상적으로 로드되었습니다.")
+        return page_source
 
     raise Exception(f"{max_retries}번 시도 후에도 페이지를 로드하지 못했습니다: {url}")
 
+HTTP_TIMEOUT = 15
+HTTP_POOL_SIZE = 20
+HTTP_MAX_ATTEMPTS = 3
+
+http_session = None
+
+
+def get_http_session():
+    """
+    keep-alive 연결을 재사용하는 공용 requests.Session 반환.
+    """
+    global http_session
+    if http_session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        session.headers.update({
+            "User-Agent": USER_AGENT,
+            "Accept-Language": "ko-KR,ko;q=0.9,en-US;q=0.8,en;q=0.7",
+        })
+        http_session = session
+    return http_session
+
+
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = 'lxml'
+except ImportError:
+    HTML_PARSER = 'html.parser'
+
+
+class PageDocument:
+    """
+    페이지 하나의 HTML 과 파싱 트리.
+    처음 soup 를 읽을 때 한 번만 파싱하고, 마커 확인 / 링크 추출 / 이미지 탐색 /
+    HTML 축소 / 규칙 추출이 모두 같은 트리를 공유한다.
+    lxml 이 설치되어 있으면 lxml 파서를, 없으면 html.parser 를 사용.
+    """
+
+    def __init__(self, html, url, site_name=""):
+        self.html = html
+        self.url = url
+        self.site_name = site_name
+        self._soup = None
+
+    @property
+    def soup(self):
+        if self._soup is None:
+            with metrics.timer("html_parse", self.site_name, chars=len(self.html), parser=HTML_PARSER):
+                self._soup = BeautifulSoup(self.html, HTML_PARSER)
+        return self._soup
+
+    def absolute_url(self, href):
+        return urljoin(self.url, href)
+
+    def close(self):
+        """
+        파싱 트리를 해제. bs4 트리는 부모/형제 참조가 순환하므로 decompose 로 끊어야
+        순환 GC 를 기다리지 않고 바로 메모리가 반환된다.
+        """
+        if self._soup is not None:
+            self._soup.decompose()
+            self._soup = None
+        self.html = None
+
+
+def has_markers(document, markers):
+    """
+    문서에 필요한 selector 가 모두 존재하는지 확인.
+    """
+    if BLOCKED_PAGE_TEXT in document.html:
+        return False
+    if not markers:
+        return True
+    return all(document.soup.select_one(marker) is not None for marker in markers)
+
+
+def fetch_html_via_http(url, max_attempts=HTTP_MAX_ATTEMPTS):
+    """
+    호스트 limiter 를 거쳐 페이지를 가져온다.
+    429/5xx 나 "접속할 수 없음" 페이지는 limiter 에 기록하고 백오프 후 다시 시도한다.
+    """
+    limiter = get_host_limiter(url)
+    last_error = None
+
+    for _ in range(max_attempts):
+        try:
+            with limiter.slot():
+                response = get_http_session().get(url, timeout=HTTP_TIMEOUT)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            limiter.record_throttle()
+            last_error = e
+            continue
+
+        if response.status_code in THROTTLE_STATUS_CODES:
+            limiter.record_throttle(parse_retry_after(response))
+            last_error = requests.HTTPError(f"{response.status_code} 응답", response=response)
+            continue
+        response.raise_for_status()
+
+        # charset 헤더가 없으면 requests 는 ISO-8859-1 로 가정하므로 본문으로 추정
+        if response.encoding is None or response.encoding.lower() == 'iso-8859-1':
+            response.encoding = response.apparent_encoding
+        if BLOCKED_PAGE_TEXT in response.text:
+            limiter.record_throttle()
+            last_error = requests.HTTPError("접속할 수 없음 페이지", response=response)
+            continue
+
+        limiter.record_success()
+        return response.text
+
+    raise last_error
+
+
+def fetch_html_via_browser(url, page_type, site_name=''):
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+
+    ready_selector = get_site_rule(site_name)['ready_selectors'].get(page_type)
+
+    with get_driver_pool().lease(site_name) as driver:
+        if page_type == 'category':
+            return load_page_with_stability(driver, url, ready_selector=ready_selector)
+
+        limiter = get_host_limiter(url)
+        with limiter.slot():
+            driver.get(url)
+            if ready_selector:
+                wait_for_page_load(driver, timeout=10, ready_selector=ready_selector)
+            else:
+                WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.TAG_NAME, "body")))
+        html_content = driver.page_source
+        if BLOCKED_PAGE_TEXT in html_content:
+            limiter.record_throttle()
+        else:
+            limiter.record_success()
+        return html_content
+
+
+PAGE_ARCHIVE_PATH = "page_archive.sqlite3"
+PAGE_ARCHIVE_ENABLED = False    # --archive-pages: 가져온 HTML 을 압축해 보관
+PAGE_REPLAY = False             # --replay: 페이지를 네트워크/브라우저 대신 보관본에서 읽음
+PAGE_ARCHIVE_COMPRESS_LEVEL = 6
+
+
+class PageNotArchived(LookupError):
+    pass
+
+
+class PageArchive:
+    """
+    가져온 페이지 HTML 을 URL + 가져온 시각으로 보관하는 저장소 (SQLite).
+    본문은 zlib 으로 압축해 내용 해시로 한 번만 저장하므로, 바뀌지 않은 페이지를
+    매 실행마다 보관해도 스냅샷 행만 늘어난다.
+    --replay 는 URL 마다 가장 최근 스냅샷을 읽어 추출/엑셀 생성만 다시 실행한다.
+    """
+
+    def __init__(self, path=PAGE_ARCHIVE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS bodies ("
+                " hash TEXT PRIMARY KEY, html BLOB NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS snapshots ("
+                " url TEXT NOT NULL, fetched_at REAL NOT NULL,"
+                " site TEXT NOT NULL, page_type TEXT NOT NULL, hash TEXT NOT NULL,"
+                " PRIMARY KEY (url, fetched_at))"
+            )
+
+    def put(self, url, html, site_name, page_type):
+        data = html.encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+        compressed = zlib.compress(data, PAGE_ARCHIVE_COMPRESS_LEVEL)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO bodies (hash, html) VALUES (?, ?)", (digest, compressed)
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO snapshots (url, fetched_at, site, page_type, hash) VALUES (?, ?, ?, ?, ?)",
+                (url, time.time(), site_name, page_type, digest),
+            )
+
+    def latest(self, url):
+        """
+        :return: URL 의 가장 최근 스냅샷 HTML, 보관본이 없으면 None
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT b.html FROM snapshots s JOIN bodies b ON b.hash = s.hash"
+                " WHERE s.url = ? ORDER BY s.fetched_at DESC LIMIT 1",
+                (url,),
+            ).fetchone()
+        if row is None:
+            return None
+        return zlib.decompress(row[0]).decode('utf-8')
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+page_archive = None
+_page_archive_lock = threading.Lock()
+
+
+def get_page_archive():
+    global page_archive
+    with _page_archive_lock:
+        if page_archive is None:
+            page_archive = PageArchive()
+        return page_archive
+
+
+def fetch_document(url, site_name, page_type='product', browser_fallback=True):
+    """
+    페이지를 가져와 PageDocument 로 반환.
+    서버 렌더링 페이지는 HTTP 로 먼저 시도하고, 사이트 규칙상 JS 가 필요하거나
+    응답에 기대한 마커가 없으면 브라우저로 다시 로드한다.
+    마커 확인에 쓴 파싱 트리는 문서에 남아 이후 단계에서 재사용된다.
+    --archive-pages 면 가져온 HTML 을 보관하고, --replay 면 보관본만 읽는다.
+    :param page_type: 'category' 또는 'product'
+    :param browser_fallback: False 면 HTTP 응답을 마커 확인 없이 그대로 반환하고 실패해도 브라우저로
+                             다시 시도하지 않는다 (끝을 넘었을 수 있는 카테고리 페이지 확인용)
+    """
+    if PAGE_REPLAY:
+        with metrics.timer("fetch_archive", site_name, page_type=page_type):
+            html_content = get_page_archive().latest(url)
+        if html_content is None:
+            raise PageNotArchived(f"보관된 페이지가 없습니다: {url}")
+        return PageDocument(html_content, url, site_name)
+
+    document = _fetch_live_document(url, site_name, page_type, browser_fallback)
+    if PAGE_ARCHIVE_ENABLED:
+        get_page_archive().put(url, document.html, site_name, page_type)
+    return document
+
+
+def _fetch_live_document(url, site_name, page_type, browser_fallback=True):
+    rule = get_site_rule(site_name)
+
+    if not rule['needs_js']:
+        try:
+            with metrics.timer("fetch_http", site_name, page_type=page_type):
+                html_content = fetch_html_via_http(url)
+            document = PageDocument(html_content, url, site_name)
+            if not browser_fallback or has_markers(document, rule[f'{page_type}_markers']):
+                logger.debug(f"HTTP 로드 성공: {url}")
+                return document
+            logger.info(f"HTTP 응답에 필요한 마커가 없어 브라우저로 재시도: {url}")
+        except requests.RequestException as e:
+            if not browser_fallback:
+                raise
+            logger.info(f"HTTP 로드 실패, 브라우저로 재시도: {url} ({e})")
+
+    with metrics.timer("fetch_browser", site_name, page_type=page_type):
+        html_content = fetch_html_via_browser(url, page_type, site_name)
+    return PageDocument(html_content, url, site_name)
+
+
 def save_urls_to_excel(urls_list, filename="urls_list.xlsx"):
     """
     주어진 URL 리스트를 엑셀 파일로 저장.
     :param urls_list: URL 리스트
     :param filename: 저장할 엑셀 파일 이름
     """
+    import pandas as pd
+
     # 데이터프레임 생성
     df = pd.DataFrame(urls_list, columns=["URL"])
     
@@ -202,51 +1225,142 @@ def save_urls_to_excel(urls_list, filename="urls_list.xlsx"):
     print(f"URL 리스트가 {filename} 파일로 저장되었습니다.")
 
 
-def get_product_urls(category_url, site_name):
-    driver = setup_driver()
-    product_urls = set()  # 중복 제거를 위해 set 사용
-    
-    try:
-        if '퀄엔드' in site_name:
-            # driver.get(category_url)
-            # time.sleep(5)
-            
-            # # 페이지 끝까지 스크롤
-            # last_height = driver.execute_script("return document.body.scrollHeight")
-            # while True:
-            #     driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-            #     time.sleep(2)
-            #     new_height = driver.execute_script("return document.body.scrollHeight")
-            #     if new_height == last_height:
-            #         break
-            #     last_height = new_height
-            
-            html_content = load_page_with_stability(driver, category_url)
-            soup = BeautifulSoup(html_content, 'html.parser')
-            
-            # 상품 링크 찾기 - 더 구체적인 selector 사용
-            product_containers = soup.select('div.col-sm-3')
-            
-            for container in product_containers:
-                link = container.find('a', href=lambda x: x and 'it_id' in x)
-                if link:
-                    href = link.get('href')
-                    full_url = urljoin(category_url, href)
-                    product_urls.add(full_url)  # set을 사용하여 중복 제거
-            
-            print(f"총 상품 수: {len(product_urls)}")
+CATEGORY_PAGE_CONCURRENCY = 4   # 카테고리 페이지를 동시에 가져오는 수 (호스트당)
+MAX_CATEGORY_PAGES = 200
 
-        elif '네임밸류' in site_name:
-            # 다른 사이트는 나중에 처리
-            pass
-            
-        elif '바이헤븐' in site_name:
-            # 다른 사이트는 나중에 처리
-            pass
-    
+
+def parse_category_page(document, card_selector):
+    """
+    카테고리 페이지에서 상품 카드별 첫 번째 it_id 링크를 순서대로 반환.
+    """
+    urls = []
+    for container in document.soup.select(card_selector):
+        link = container.find('a', href=lambda x: x and 'it_id' in x)
+        if link:
+            urls.append(document.absolute_url(link.get('href')))
+    return urls
+
+
+def find_last_page(document):
+    """
+    페이지 번호 링크(page=N)에서 마지막 페이지 번호를 찾는다. 없으면 None.
+    """
+    base_path = urlparse(document.url).path
+    last_page = None
+    for link in document.soup.find_all('a', href=True):
+        parsed = urlparse(document.absolute_url(link['href']))
+        if parsed.path != base_path:
+            continue
+        for value in parse_qs(parsed.query).get('page', []):
+            if value.isdigit():
+                last_page = max(last_page or 0, int(value))
+    return last_page
+
+
+def with_page(url, page):
+    parsed = urlparse(url)
+    query = parse_qs(parsed.query, keep_blank_values=True)
+    query['page'] = [str(page)]
+    return urlunparse(parsed._replace(query=urlencode(query, doseq=True)))
+
+
+def crawl_category(category_url, site_name, card_selector):
+    """
+    카테고리의 모든 페이지에서 상품 URL 을 수집.
+    첫 페이지에서 페이지 번호 링크로 마지막 페이지를 찾고, 나머지 페이지는 CATEGORY_PAGE_CONCURRENCY 개씩
+    동시에 가져온다. 페이지 링크가 없으면 page=2, 3... 을 차례로 시도하고, 로드에 실패하면 멈춘다.
+    두 번째 페이지부터는 HTTP 응답을 그대로 쓰며 (JS 가 필요한 사이트 제외) 상품 카드가 없으면 끝으로 본다.
+    새 it_id 를 하나도 추가하지 못한 페이지가 나오면 그 묶음까지만 처리하고 멈춘다.
+    :return: it_id 기준으로 중복을 제거한 URL 리스트 (발견 순서)
+    """
+    product_urls = {}  # it_id → URL
+
+    def add_urls(urls):
+        added = 0
+        for url in urls:
+            product_id = extract_product_id(url)
+            if product_id not in product_urls:
+                product_urls[product_id] = url
+                added += 1
+        return added
+
+    def fetch_page(page):
+        # 마지막 페이지를 넘으면 상품 카드가 없는 목록이 오므로 마커가 없다고 브라우저로 넘기지 않고
+        # 빈 결과로 받아 수집 종료 조건으로 쓴다
+        document = fetch_document(with_page(category_url, page), site_name, 'category', browser_fallback=False)
+        try:
+            return parse_category_page(document, card_selector)
+        finally:
+            document.close()
+
+    first_page = fetch_document(category_url, site_name, 'category')
+    try:
+        if not add_urls(parse_category_page(first_page, card_selector)):
+            return []
+        last_page = find_last_page(first_page)
     finally:
-        driver.quit()
+        first_page.close()
+    max_page = min(last_page or MAX_CATEGORY_PAGES, MAX_CATEGORY_PAGES)
+    logger.info(f"[{site_name}] 카테고리 마지막 페이지: {last_page or '알 수 없음'}")
+
+    page = 2
+    with ThreadPoolExecutor(max_workers=CATEGORY_PAGE_CONCURRENCY, thread_name_prefix="category") as executor:
+        while page <= max_page:
+            # 페이지 링크가 없으면 끝을 모르므로 한 페이지씩 확인
+            wave_size = CATEGORY_PAGE_CONCURRENCY if last_page else 1
+            pages = list(range(page, min(page + wave_size, max_page + 1)))
+            page += len(pages)
+
+            exhausted = False
+            for page_number, future in [(n, executor.submit(fetch_page, n)) for n in pages]:
+                try:
+                    added = add_urls(future.result())
+                except Exception as e:
+                    logger.warning(f"[{site_name}] {page_number} 페이지 로드 실패: {e}")
+                    # 마지막 페이지를 알면 일시적인 실패로 보고 계속, 모르면 끝을 넘은 것일 수 있으므로 중단
+                    if not last_page:
+                        exhausted = True
+                    continue
+                if added == 0:
+                    exhausted = True
+
+            if exhausted:
+                logger.info(f"[{site_name}] {page - 1} 페이지까지 확인, 새 상품이 없어 수집 종료")
+                break
+
+    return list(product_urls.values())
+
+
+def get_product_urls(category_url, site_name):
+    product_urls = []
     
+    if '퀄엔드' in site_name:
+        # driver.get(category_url)
+        # time.sleep(5)
+        
+        # # 페이지 끝까지 스크롤
+        # last_height = driver.execute_script("return document.body.scrollHeight")
+        # while True:
+        #     driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+        #     time.sleep(2)
+        #     new_height = driver.execute_script("return document.body.scrollHeight")
+        #     if new_height == last_height:
+        #         break
+        #     last_height = new_height
+        
+        # 상품 링크 찾기 - 더 구체적인 selector 사용
+        product_urls = crawl_category(category_url, site_name, 'div.col-sm-3')
+        
+        print(f"총 상품 수: {len(product_urls)}")
+
+    elif '네임밸류' in site_name:
+        # 다른 사이트는 나중에 처리
+        pass
+        
+    elif '바이헤븐' in site_name:
+        # 다른 사이트는 나중에 처리
+        pass
+
     urls_list = list(product_urls)
     save_urls_to_excel(urls_list, "urls_list.xlsx")
     print(f"\n중복 제거 후 URL 수: {len(urls_list)}")
@@ -255,12 +1369,393 @@ def get_product_urls(category_url, site_name):
 
 
 
-def ai_parse(html_data):
-    prompt = f"""```html_data
-{html_data}
-```
+# HTML 축소 시 통째로 버리는 태그
+REDUCE_DROP_TAGS = {
+    'script', 'style', 'noscript', 'iframe', 'svg', 'link', 'meta', 'head', 'template',
+    'img', 'picture', 'video', 'audio', 'canvas', 'object', 'embed',
+}
+# 범용 축소에서 추가로 버리는 레이아웃 태그
+REDUCE_LAYOUT_TAGS = {'nav', 'footer', 'header', 'aside'}
+REDUCE_KEEP_ATTRS = ('id', 'class', 'name', 'for', 'selected')
+REDUCE_VOID_TAGS = {'input', 'br', 'hr'}
+# id/class 로 판별하는 메뉴, 푸터, 배너 등 공통 레이아웃 영역
+REDUCE_NOISE_PATTERN = re.compile(
+    r'(^|[-_])(nav|gnb|lnb|snb|menu|footer|ft|hd|header|banner|quick|popup|login|sns|share|cookie)([-_]|$)',
+    re.IGNORECASE,
+)
+REDUCED_HTML_MAX_CHARS = 30000
+
+
+def _is_noise_element(tag):
+    if tag.name in REDUCE_LAYOUT_TAGS:
+        return True
+    names = [tag.get('id') or ''] + list(tag.get('class') or [])
+    return any(REDUCE_NOISE_PATTERN.search(name) for name in names if name)
+
+
+def _render_reduced(node, parts, drop_noise):
+    """
+    원본 트리를 건드리지 않고 텍스트/구조만 남긴 압축 HTML 을 parts 에 추가.
+    """
+    if isinstance(node, (Comment, Declaration, Doctype, ProcessingInstruction, CData)):
+        return
+    if isinstance(node, NavigableString):
+        text = " ".join(str(node).split())
+        if text:
+            parts.append(html_lib.escape(text, quote=False))
+        return
+    if not isinstance(node, Tag) or node.name in REDUCE_DROP_TAGS:
+        return
+    if drop_noise and _is_noise_element(node):
+        return
+
+    attrs = []
+    # 숨은 input 의 value 에 가격 등이 들어있는 경우가 많음
+    keep_attrs = REDUCE_KEEP_ATTRS + ('value',) if node.name == 'input' else REDUCE_KEEP_ATTRS
+    for attr in keep_attrs:
+        value = node.get(attr)
+        if value is None:
+            continue
+        if isinstance(value, list):
+            value = " ".join(value)
+        attrs.append(f' {attr}="{html_lib.escape(value)}"' if value else f' {attr}')
+
+    if node.name in REDUCE_VOID_TAGS:
+        if attrs:
+            parts.append(f"<{node.name}{''.join(attrs)}>")
+        return
+
+    start = len(parts)
+    parts.append(f"<{node.name}{''.join(attrs)}>")
+    for child in node.children:
+        _render_reduced(child, parts, drop_noise)
+
+    if len(parts) == start + 1 and node.name not in ('select', 'option'):
+        # 내용이 없는 빈 래퍼 태그는 생략
+        parts.pop()
+        return
+    parts.append(f"</{node.name}>")
+
+
+def reduce_html(document, site_name):
+    """
+    LLM 프롬프트용으로 상품 관련 DOM 만 남긴 HTML 을 반환.
+    사이트 규칙의 reduce_selectors 영역을 우선 사용하고, 일치하는 영역이 없으면
+    스크립트/스타일/메뉴/푸터 등을 제거한 본문 전체로 대체한다.
+    """
+    soup = document.soup
+
+    parts = []
+    title = soup.title.get_text(" ", strip=True) if soup.title else ""
+    if title:
+        parts.append(f"<title>{html_lib.escape(title, quote=False)}</title>")
+    for meta in soup.find_all('meta', attrs={'property': re.compile(r'^og:(title|description|price)')}):
+        if meta.get('content'):
+            parts.append(f'<meta property="{meta["property"]}" content="{html_lib.escape(meta["content"])}">')
+
+    # selector 들을 하나로 묶어 트리를 한 번만 순회 (결과는 문서 순서)
+    reduce_selectors = get_site_rule(site_name)['reduce_selectors']
+    selected = soup.select(", ".join(reduce_selectors)) if reduce_selectors else []
+    # 이미 선택된 영역 안에 포함된 요소는 중복 제외
+    selected_ids = {id(el) for el in selected}
+    selected = [el for el in selected if not any(id(parent) in selected_ids for parent in el.parents)]
+    selected = list({id(el): el for el in selected}.values())
+
+    if selected:
+        for element in selected:
+            _render_reduced(element, parts, drop_noise=False)
+    else:
+        _render_reduced(soup.body or soup, parts, drop_noise=True)
+
+    reduced = "".join(parts)[:REDUCED_HTML_MAX_CHARS]
+    before, after = len(document.html), len(reduced)
+    logger.info(
+        f"HTML 축소 ({'사이트 규칙' if selected else '범용'}): "
+        f"{before:,} → {after:,} 자 ({after / max(before, 1):.1%})"
+    )
+    return reduced
+
+
+# 프롬프트 구성 방식(섹션 순서, known_data 형식 등 코드)을 바꾸면 올린다.
+# 문구(템플릿 상수)를 바꾼 것은 PROMPT_VERSION 의 해시에 자동으로 반영된다.
+PROMPT_REVISION = "1"
+
+LLM_CACHE_PATH = "llm_cache.sqlite3"
+LLM_CACHE_ENABLED = True
+LLM_CACHE_TTL_SECONDS = 14 * 24 * 60 * 60
+LLM_CACHE_MAX_ENTRIES = 50000
+
+
+class LLMCache:
+    """
+    ai_parse 응답을 디스크(SQLite)에 저장하는 캐시.
+    키는 정규화된 HTML + 프롬프트 버전 + 모델 이름의 해시.
+    """
+
+    EVICT_EVERY = 200  # set() 이 이 횟수만큼 호출될 때마다 정리
+
+    def __init__(self, path, ttl_seconds=LLM_CACHE_TTL_SECONDS, max_entries=LLM_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                " key TEXT PRIMARY KEY,"
+                " response TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " accessed_at REAL NOT NULL)"
+            )
+        self.evict()
+
+    @staticmethod
+    def make_key(html_data, *extra):
+        normalized = " ".join(html_data.split())
+        digest = hashlib.sha256()
+        for part in (PROMPT_VERSION, get_config()['model'], *extra, normalized):
+            digest.update(str(part).encode('utf-8'))
+            digest.update(b"\x00")
+        return digest.hexdigest()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if self.ttl_seconds and now - row[1] > self.ttl_seconds:
+                with self._conn:
+                    self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                return None
+            with self._conn:
+                self._conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        now = time.time()
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, response, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(value, ensure_ascii=False), now, now),
+                )
+            self._writes += 1
+            should_evict = self._writes % self.EVICT_EVERY == 0
+        if should_evict:
+            self.evict()
+
+    def evict(self):
+        """
+        만료된 항목을 지우고, 최대 개수를 넘으면 가장 오래 사용되지 않은 항목부터 삭제.
+        """
+        with self._lock, self._conn:
+            if self.ttl_seconds:
+                self._conn.execute(
+                    "DELETE FROM llm_cache WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+                )
+            if self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM llm_cache WHERE key IN ("
+                    " SELECT key FROM llm_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+llm_cache = None
+_llm_cache_lock = threading.Lock()
+
+
+def get_llm_cache():
+    """
+    공용 LLM 캐시 반환. --no-llm-cache 로 비활성화되었으면 None.
+    """
+    global llm_cache
+    if not LLM_CACHE_ENABLED:
+        return None
+    with _llm_cache_lock:
+        if llm_cache is None:
+            llm_cache = LLMCache(LLM_CACHE_PATH)
+        return llm_cache
+
+
+RULE_EXTRACTION_ENABLED = True
+RULE_CONFIDENCE_THRESHOLD = 0.7
+
+# 값의 출처별 신뢰도 (속성값은 구조화된 데이터라 텍스트보다 높게)
+RULE_CONFIDENCE_ATTR = 0.95
+RULE_CONFIDENCE_TEXT = 0.8
+RULE_CONFIDENCE_OPTIONS = 0.9
+RULE_CONFIDENCE_NO_OPTIONS = 0.75
+
+OPTION_COLOR_PATTERN = re.compile(r'색상|컬러|칼라|color|colour', re.IGNORECASE)
+OPTION_SIZE_PATTERN = re.compile(r'사이즈|치수|size', re.IGNORECASE)
+# 옵션명 뒤에 붙는 추가금액 표기 예: "블랙 (+1,000원)"
+OPTION_PRICE_SUFFIX = re.compile(r'\s*\(\s*[+-]\s*[\d,]+\s*원?\s*\)|\s*\(\s*[\d,]+\s*원\s*\)')
+OPTION_PLACEHOLDER = re.compile(r'^(-+\s*)?(옵션\s*)?선택|^-+$')
+HANGUL_PATTERN = re.compile(r'[가-힣]')
+
+
+def _element_text(element):
+    # 스크린리더 전용 문구(영카트 .sound_only)는 제외
+    texts = [
+        text for text in element.find_all(string=True)
+        if not any('sound_only' in (parent.get('class') or []) for parent in text.parents if isinstance(parent, Tag))
+    ]
+    return " ".join(" ".join(texts).split())
+
+
+def _parse_amount(text):
+    match = re.search(r'\d[\d,]*', text or "")
+    if not match:
+        return None
+    amount = int(match.group(0).replace(",", ""))
+    # 0원이나 비정상적으로 큰 값은 가격으로 보지 않음
+    return amount if 0 < amount < 1_000_000_000 else None
+
+
+def _select_value(soup, candidates):
+    """
+    후보 (selector, 속성) 를 순서대로 시도해 처음 찾은 (값, 신뢰도) 반환.
+    """
+    for selector, attr in candidates:
+        element = soup.select_one(selector)
+        if element is None:
+            continue
+        if attr:
+            value = element.get(attr)
+            if value:
+                return value, RULE_CONFIDENCE_ATTR
+        else:
+            value = _element_text(element)
+            if value:
+                return value, RULE_CONFIDENCE_TEXT
+    return None, 0.0
+
+
+def _extract_options(soup, rules):
+    """
+    옵션 select 에서 색상/사이즈 목록 추출. 분류할 수 없는 select 가 있으면 해당 필드는 비워둔다.
+    """
+    extracted = {}
+    selects = soup.select(rules['options'])
+
+    if not selects:
+        # 구매 폼은 있는데 옵션이 없다면 옵션 없는 상품
+        if rules.get('option_form') and soup.select_one(rules['option_form']) is not None:
+            extracted['colors'] = ([], RULE_CONFIDENCE_NO_OPTIONS)
+            extracted['sizes'] = ([], RULE_CONFIDENCE_NO_OPTIONS)
+        return extracted
+
+    for select in selects:
+        label = ""
+        if select.get('id'):
+            label_tag = soup.find('label', attrs={'for': select['id']})
+            if label_tag is not None:
+                label = _element_text(label_tag)
+        label = label or select.get('title') or select.get('name') or ""
+
+        values = []
+        for option in select.find_all('option'):
+            text = OPTION_PRICE_SUFFIX.sub("", _element_text(option)).strip()
+            if not option.get('value') or not text or OPTION_PLACEHOLDER.search(text):
+                continue
+            values.append(text)
+
+        # 하위 옵션은 상위 옵션 선택 후 채워지므로 비어있으면 판단하지 않음
+        if not values:
+            continue
+        if OPTION_COLOR_PATTERN.search(label):
+            extracted['colors'] = (values, RULE_CONFIDENCE_OPTIONS)
+        elif OPTION_SIZE_PATTERN.search(label):
+            extracted['sizes'] = (values, RULE_CONFIDENCE_OPTIONS)
+
+    return extracted
+
+
+def extract_by_rules(document, site_name):
+    """
+    사이트 규칙으로 가격, 시중가, 상품명, 옵션을 추출.
+    신뢰도가 RULE_CONFIDENCE_THRESHOLD 이상인 필드만 반환하며, 나머지는 LLM 이 채운다.
+    :return: {필드: 값}
+    """
+    rules = get_site_rule(site_name)['extract']
+    if not RULE_EXTRACTION_ENABLED or not rules:
+        return {}
+
+    soup = document.soup
+
+    candidates = {}
+
+    if 'price' in rules:
+        value, confidence = _select_value(soup, rules['price'])
+        price = _parse_amount(value)
+        if price is not None:
+            candidates['price'] = (price, confidence)
+
+    if 'market_price' in rules:
+        value, confidence = _select_value(soup, rules['market_price'])
+        market_price = _parse_amount(value)
+        if market_price is not None:
+            candidates['market_price'] = (str(market_price), confidence)
+
+    if 'kor_name' in rules:
+        value, confidence = _select_value(soup, rules['kor_name'])
+        if value:
+            # 한글이 없는 상품명은 번역/정리가 필요하므로 신뢰도를 낮춤
+            if not HANGUL_PATTERN.search(value):
+                confidence = 0.5
+            candidates['kor_name'] = (value, confidence)
+
+    if 'options' in rules:
+        candidates.update(_extract_options(soup, rules))
+
+    return {
+        field: value
+        for field, (value, confidence) in candidates.items()
+        if confidence >= RULE_CONFIDENCE_THRESHOLD
+    }
+
 
-```available_brand_data
+def ai_parse(html_data, url=None, fields=None, known=None, site_name=""):
+    """
+    상품 HTML 을 LLM 으로 파싱. 배치 모드이고 url 이 주어지면 다른 상품과 묶어 요청한다.
+    :param fields: 요청할 필드 목록 (기본: 전체)
+    :param known: 규칙으로 이미 추출한 값
+    :param site_name: 소요 시간을 기록할 사이트
+    """
+    fields = list(fields or PROMPT_FIELDS)
+    cache = get_llm_cache()
+    cache_key = None
+    if cache:
+        extra = ()
+        if fields != PROMPT_FIELDS or known:
+            extra = (",".join(fields), json.dumps(known or {}, ensure_ascii=False, sort_keys=True))
+        cache_key = LLMCache.make_key(html_data, *extra)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            logger.debug("LLM 캐시 적중")
+            return cached
+
+    if LLM_BATCH_ENABLED and url is not None:
+        parsed = get_llm_batcher().submit(url, html_data, fields, known, site_name).result()
+    else:
+        parsed = ai_generate(html_data, fields, known, site_name)
+    if cache:
+        cache.set(cache_key, parsed)
+    return parsed
+
+
+PROMPT_BRAND_DATA = """```available_brand_data
 [
     "ASK YOURSELF",
     "ACNE STUDIOS",
@@ -380,10 +1875,10 @@ def ai_parse(html_data):
     "ZEGNA",
     "OTHERS"
     ]
-```
+```"""
 
-```available_category_data
-{{
+PROMPT_CATEGORY_DATA = """```available_category_data
+{
     "상의": ["반팔 티셔츠", "긴팔 티셔츠", "니트/가디건", "맨투맨", "후드", "원피스", "셔츠", "드레스", "슬리브리스", "셋업", "기타 상의"],
     "아우터": ["집업", "자켓", "패딩", "레더", "코트", "기타 아우터"],
     "하의": ["팬츠", "쇼츠", "트레이닝 팬츠", "데님", "스커트", "기타 하의"],
@@ -394,12 +1889,10 @@ def ai_parse(html_data):
     "패션잡화": ["머플러/스카프", "아이웨어", "넥타이", "모자", "헤어액세서리", "기타 잡화"],
     "액세서리": ["반지", "목걸이", "팔찌", "귀걸이", "키링", "브로치", "기타 ACC"],
     "벨트": []
-}}
-```
+}
+```"""
 
-Process the given html_data into a comma-separated dict format JSON data containing the following elements.
-
-price : int (상품의 판매 가격),
+PROMPT_FIELD_SPEC = """price : int (상품의 판매 가격),
 market_price : str (상품의 정품 가격 또는 매장 가격. 찾을 수 없다면 공백),
 brand : string (상품의 영어 브랜드 이름. 반드시 available_brand_data 에 포함되어야 함. 포함되지 않는다면 공백),
 first_category : string (상품의 1차 카테고리 분류. 반드시 available_category_data의 key 에 포함되어야 함. 포함되지 않는다면 공백),
@@ -409,278 +1902,2021 @@ colors : list(string) (상품의 색상 옵션값. 찾을 수 없다면 []),
 sizes : list(string) (상품의 사이즈 옵션값. 찾을 수 없다면 []),
 kor_name : string (상품의 한글 이름. 이름 앞에 브랜드가 딱 한번 적혀 있어야 하며 반드시 한글이어야 함),
 eng_name : string (상품의 한글 이름의 영어 번역 결과. 이름 앞에 브랜드가 딱 한번 적혀 있어야 하며 반드시 영어여야 함),
-genuine_number : string (상품의 정품 코드. 정품 번호는 제품 이름에 의미 없는 문자와 숫자의 조합으로 표시될 수 있음. 찾을 수 없다면 공백)
-"""
+genuine_number : string (상품의 정품 코드. 정품 번호는 제품 이름에 의미 없는 문자와 숫자의 조합으로 표시될 수 있음. 찾을 수 없다면 공백)"""
 
-    response = model.generate_content(prompt).text.strip()
-    return json.loads(response)
-def process_product(url, store_name, folder_name):
-    driver = setup_driver()
-    success = False
-    
-    try:
-        driver.get(url)
-        WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.TAG_NAME, "body")))
-        html_data = driver.page_source
-        
-        # 이미지 처리
-        folder_path = os.path.join(f"이미지/{store_name}", folder_name)
-        os.makedirs(folder_path, exist_ok=True)
-        
-        soup = BeautifulSoup(html_data, 'html.parser')
-        img_tags = soup.find_all("img")
-        thumb_path = ""
-        
-        idx = 0
-        for img in img_tags:
-            if 'src' not in img.attrs:
-                continue
-                
-            img_url = urljoin(url, img['src'])
-            if (';base64,' in img_url or 
-                img_url.lower().endswith('.svg') or 
-                '//img.echosting.cafe24.com/' in img_url or 
-                '/theme/' in img_url or 
-                any(x in img_url.lower() for x in ['facebook', 'icon', 'logo', 'common', 'banner', 'brand'])):
-                continue
-            
-            try:
-                img_response = requests.get(img_url, timeout=10)
-                img_response.raise_for_status()
-                
-                if not is_valid_image(img_response.content):
+PROMPT_FIELDS = [
+    'price', 'market_price', 'brand', 'first_category', 'second_category', 'gender',
+    'colors', 'sizes', 'kor_name', 'eng_name', 'genuine_number',
+]
+
+# 필드 이름 → 설명 한 줄 (필요한 필드만 프롬프트에 넣기 위함)
+PROMPT_FIELD_LINES = {
+    line.split(" : ", 1)[0]: line.rstrip(",")
+    for line in PROMPT_FIELD_SPEC.splitlines()
+}
+
+PROMPT_KNOWN_DATA_HINT = " known_data contains values already extracted from the page; use them as context and do not output them again."
+
+PROMPT_INSTRUCTION = "Process the given html_data into a comma-separated dict format JSON data containing the following elements."
+PROMPT_BATCH_INSTRUCTION = (
+    "Process each html_data block above into a JSON array. Each element corresponds to one html_data block "
+    "and is a dict containing \"url\" (the url written after html_data, copied exactly) and the following elements."
+)
+
+# LLM 캐시 키에 들어가는 프롬프트 버전. 템플릿 문구의 해시라서 프롬프트를 고치면 (--replay 로 다시 추출할 때도)
+# 버전을 직접 올리지 않아도 이전 캐시 응답이 재사용되지 않는다.
+PROMPT_VERSION = PROMPT_REVISION + "-" + hashlib.sha256("\x00".join([
+    PROMPT_BRAND_DATA, PROMPT_CATEGORY_DATA, PROMPT_FIELD_SPEC, PROMPT_KNOWN_DATA_HINT,
+    PROMPT_INSTRUCTION, PROMPT_BATCH_INSTRUCTION,
+]).encode('utf-8')).hexdigest()[:16]
+
+
+def build_reference_data(fields):
+    """
+    요청할 필드에 필요한 참고 데이터(브랜드 목록, 카테고리 트리)만 반환.
+    """
+    parts = []
+    if 'brand' in fields:
+        parts.append(PROMPT_BRAND_DATA)
+    if 'first_category' in fields or 'second_category' in fields:
+        parts.append(PROMPT_CATEGORY_DATA)
+    return "\n\n".join(parts)
+
+
+def build_field_spec(fields):
+    return ",\n".join(PROMPT_FIELD_LINES[field] for field in PROMPT_FIELDS if field in fields)
+
+
+def format_known_data(known, url=None):
+    label = f"known_data url={url}" if url else "known_data"
+    return f"```{label}\n{json.dumps(known, ensure_ascii=False)}\n```"
+
+
+def ai_generate(html_data, fields=None, known=None, site_name=""):
+    """
+    상품 하나를 LLM 으로 파싱.
+    :param fields: 요청할 필드 목록 (기본: 전체)
+    :param known: 규칙으로 이미 추출한 값. 프롬프트에 참고용으로 넣는다
+    """
+    fields = fields or PROMPT_FIELDS
+    instruction = PROMPT_INSTRUCTION
+
+    sections = [f"```html_data\n{html_data}\n```"]
+    if known:
+        sections.append(format_known_data(known))
+        instruction += PROMPT_KNOWN_DATA_HINT
+    reference = build_reference_data(fields)
+    if reference:
+        sections.append(reference)
+    sections.append(instruction)
+    sections.append(build_field_spec(fields))
+    prompt = "\n\n".join(sections) + "\n"
+
+    with metrics.timer("llm_call", site_name, items=1, prompt_chars=len(prompt)) as event:
+        response = get_model().generate_content(prompt).text.strip()
+        event['response_chars'] = len(response)
+    return json.loads(response)
+
+
+LLM_BATCH_ENABLED = False
+LLM_BATCH_TOKEN_BUDGET = 60000      # 배치 하나에 넣을 상품 HTML 의 추정 토큰 합계 상한
+LLM_BATCH_MAX_ITEMS = 12            # 출력 토큰 한도(8192)를 넘지 않도록 상품 수 상한
+LLM_BATCH_LINGER_SECONDS = 1.5      # 첫 상품이 들어온 뒤 다른 상품을 기다리는 최대 시간
+LLM_BATCH_MAX_IN_FLIGHT = 4         # 동시에 진행하는 배치 요청 수
+
+
+class MalformedBatchResponse(ValueError):
+    pass
+
+
+def estimate_tokens(text):
+    """
+    대략적인 토큰 수 추정 (HTML 은 약 4자, 한글은 약 1~2자당 1토큰이므로 보수적으로 2.5자).
+    """
+    return int(len(text) / 2.5) + 1
+
+
+def ai_generate_batch(items, site_name=""):
+    """
+    여러 상품을 한 번의 generate_content 호출로 파싱.
+    응답이 깨졌거나 일부 상품이 빠지면 배치를 나눠 다시 요청한다.
+    나눠서 다시 요청한 부분이 실패하면 그 부분의 상품만 예외를 값으로 받는다.
+    :param items: [(url, html_data, fields, known), ...]
+    :return: {url: parsed_data 또는 Exception}
+    """
+    if len(items) == 1:
+        url, html_data, fields, known = items[0]
+        return {url: ai_generate(html_data, fields, known, site_name)}
+
+    try:
+        parsed = _request_batch(items, site_name)
+    except MalformedBatchResponse as e:
+        logger.warning(f"배치 응답 오류, {len(items)}개 배치를 나눠 재시도: {e}")
+        middle = len(items) // 2
+        parsed = _retry_batch_part(items[:middle], site_name)
+        parsed.update(_retry_batch_part(items[middle:], site_name))
+        return parsed
+
+    missing = [item for item in items if item[0] not in parsed]
+    if missing:
+        logger.warning(f"배치 응답에서 {len(missing)}개 상품 누락, 다시 요청")
+        parsed.update(_retry_batch_part(missing, site_name))
+    return parsed
+
+
+def _retry_batch_part(items, site_name=""):
+    try:
+        return ai_generate_batch(items, site_name)
+    except Exception as e:
+        logger.warning(f"배치 일부({len(items)}개) 재요청 실패: {e}")
+        return {item[0]: e for item in items}
+
+
+def _request_batch(items, site_name=""):
+    fields = [field for field in PROMPT_FIELDS if any(field in item[2] for item in items)]
+    blocks = []
+    for url, html_data, _, known in items:
+        blocks.append(f"```html_data url={url}\n{html_data}\n```")
+        if known:
+            blocks.append(format_known_data(known, url))
+
+    instruction = PROMPT_BATCH_INSTRUCTION
+    if any(item[3] for item in items):
+        instruction += PROMPT_KNOWN_DATA_HINT
+
+    # 공통 참고 데이터를 앞에 두고 상품별 HTML 을 뒤에 붙임
+    sections = []
+    reference = build_reference_data(fields)
+    if reference:
+        sections.append(reference)
+    sections.append("\n\n".join(blocks))
+    sections.append(instruction)
+    sections.append(build_field_spec(fields))
+    prompt = "\n\n".join(sections) + "\n"
+
+    with metrics.timer("llm_call", site_name, items=len(items), prompt_chars=len(prompt)) as event:
+        response = get_batch_model().generate_content(prompt).text.strip()
+        event['response_chars'] = len(response)
+    try:
+        data = json.loads(response)
+    except json.JSONDecodeError as e:
+        raise MalformedBatchResponse(f"JSON 파싱 실패: {e}")
+    if not isinstance(data, list):
+        raise MalformedBatchResponse("응답이 배열이 아님")
+
+    requested = {url: item_fields for url, _, item_fields, _ in items}
+    parsed = {}
+    for entry in data:
+        if not isinstance(entry, dict) or entry.get('url') not in requested:
+            continue
+        if any(field not in entry for field in requested[entry['url']]):
+            continue
+        parsed[entry.pop('url')] = entry
+
+    if not parsed:
+        raise MalformedBatchResponse("유효한 상품 응답이 없음")
+    return parsed
+
+
+class LLMBatcher:
+    """
+    여러 워커가 제출한 상품을 모아 배치로 LLM 에 요청.
+    토큰 예산/상품 수 상한이 차거나 linger 시간이 지나면 배치를 보낸다.
+    """
+
+    def __init__(self, token_budget=None, max_items=None, linger=None, max_in_flight=LLM_BATCH_MAX_IN_FLIGHT):
+        self.token_budget = token_budget or LLM_BATCH_TOKEN_BUDGET
+        self.max_items = max_items or LLM_BATCH_MAX_ITEMS
+        self.linger = LLM_BATCH_LINGER_SECONDS if linger is None else linger
+        self._pending = []  # (url, html_data, fields, known, tokens, site_name, future)
+        self._pending_tokens = 0
+        self._first_at = None
+        self._closed = False
+        self._cond = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="llm-batch")
+        self._thread = threading.Thread(target=self._run, name="llm-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, url, html_data, fields=None, known=None, site_name=""):
+        future = Future()
+        fields = list(fields or PROMPT_FIELDS)
+        tokens = estimate_tokens(html_data) + (estimate_tokens(json.dumps(known, ensure_ascii=False)) if known else 0)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("LLMBatcher가 이미 종료되었습니다.")
+            if not self._pending:
+                self._first_at = time.monotonic()
+            self._pending.append((url, html_data, fields, known, tokens, site_name, future))
+            self._pending_tokens += tokens
+            self._cond.notify()
+        return future
+
+    def _ready(self):
+        if not self._pending:
+            return False
+        return (
+            self._closed
+            or len(self._pending) >= self.max_items
+            or self._pending_tokens >= self.token_budget
+            or time.monotonic() - self._first_at >= self.linger
+        )
+
+    def _take_batch(self):
+        # 예산 안에서 최대한 많이 담되, 최소 1개는 보냄
+        batch, tokens = [], 0
+        while self._pending and len(batch) < self.max_items:
+            item_tokens = self._pending[0][4]
+            if batch and tokens + item_tokens > self.token_budget:
+                break
+            batch.append(self._pending.pop(0))
+            tokens += item_tokens
+        self._pending_tokens -= tokens
+        self._first_at = time.monotonic() if self._pending else None
+        return batch
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._ready():
+                    if self._closed and not self._pending:
+                        return
+                    timeout = None
+                    if self._pending:
+                        timeout = max(0.0, self.linger - (time.monotonic() - self._first_at))
+                    self._cond.wait(timeout)
+                batch = self._take_batch()
+            self._executor.submit(self._dispatch, batch)
+
+    def _dispatch(self, batch):
+        logger.info(f"LLM 배치 요청: {len(batch)}개 상품, 약 {sum(item[4] for item in batch):,} 토큰")
+        # 파이프라인은 사이트별로 돌기 때문에 보통 한 사이트의 상품만 묶이지만, 섞이면 사이트 없이 기록
+        sites = {item[5] for item in batch}
+        site_name = sites.pop() if len(sites) == 1 else ""
+        try:
+            parsed = ai_generate_batch([item[:4] for item in batch], site_name)
+        except Exception as e:
+            for *_, future in batch:
+                future.set_exception(e)
+            return
+
+        for url, *_, future in batch:
+            if isinstance(parsed.get(url), Exception):
+                future.set_exception(parsed[url])
+            elif url in parsed:
+                future.set_result(parsed[url])
+            else:
+                future.set_exception(MalformedBatchResponse(f"배치 응답에 상품이 없음: {url}"))
+
+    def close(self):
+        """
+        대기 중인 상품을 모두 보낸 뒤 종료.
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+        self._executor.shutdown(wait=True)
+
+
+llm_batcher = None
+_llm_batcher_lock = threading.Lock()
+
+
+def get_llm_batcher():
+    global llm_batcher
+    with _llm_batcher_lock:
+        if llm_batcher is None:
+            llm_batcher = LLMBatcher()
+        return llm_batcher
+
+
+def shutdown_llm_batcher():
+    global llm_batcher
+    with _llm_batcher_lock:
+        if llm_batcher is not None:
+            llm_batcher.close()
+            llm_batcher = None
+
+
+IMAGE_WORKERS = 16
+IMAGE_TIMEOUT = 10
+IMAGE_MAX_ATTEMPTS = 3
+
+_image_executor = None
+_image_executor_lock = threading.Lock()
+
+
+def get_image_executor():
+    global _image_executor
+    with _image_executor_lock:
+        if _image_executor is None:
+            _image_executor = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix="image")
+        return _image_executor
+
+
+def shutdown_image_executor():
+    global _image_executor
+    with _image_executor_lock:
+        if _image_executor is not None:
+            _image_executor.shutdown(wait=True)
+            _image_executor = None
+
+
+def find_image_urls(document):
+    """
+    상품 페이지에서 다운로드할 이미지 URL 목록을 문서 순서대로 반환.
+    아이콘/로고/배너 등 장식용 이미지는 제외.
+    """
+    img_urls = []
+    for img in document.soup.find_all("img"):
+        if 'src' not in img.attrs:
+            continue
+            
+        img_url = document.absolute_url(img['src'])
+        if (';base64,' in img_url or 
+            img_url.lower().endswith('.svg') or 
+            '//img.echosting.cafe24.com/' in img_url or 
+            '/theme/' in img_url or 
+            any(x in img_url.lower() for x in ['facebook', 'icon', 'logo', 'common', 'banner', 'brand'])):
+            continue
+
+        img_urls.append(img_url)
+    return img_urls
+
+
+IMAGE_PROBE_CHUNK = 8 * 1024
+IMAGE_PROBE_MAX_BYTES = 64 * 1024  # 이 안에서 크기를 못 읽으면 전체를 받아 PIL 로 검사
+
+
+def read_image_body(img_response):
+    """
+    스트리밍 응답을 읽으면서 헤더로 크기를 먼저 확인.
+    높이가 기준 미만이면 나머지 본문을 받지 않고 None 을 반환한다.
+    """
+    chunks = []
+    received = 0
+    probed = False
+
+    for chunk in img_response.iter_content(chunk_size=IMAGE_PROBE_CHUNK):
+        chunks.append(chunk)
+        received += len(chunk)
+
+        if not probed:
+            size = probe_image_size(b"".join(chunks))
+            if size is not None:
+                probed = True
+                if size[1] < MIN_IMAGE_HEIGHT:
+                    logger.debug(f"헤더 검사로 제외 ({size[0]}x{size[1]}): {img_response.url}")
+                    return None
+            elif received >= IMAGE_PROBE_MAX_BYTES:
+                probed = True
+
+    return b"".join(chunks)
+
+
+def fetch_image(img_url):
+    """
+    이미지 하나를 다운로드. 유효하지 않은 이미지면 None, 네트워크 오류는 예외를 그대로 올린다.
+    429/5xx 는 호스트 limiter 에 기록하고 백오프 후 다시 시도한다.
+    """
+    limiter = get_host_limiter(img_url)
+
+    for attempt in range(IMAGE_MAX_ATTEMPTS):
+        with limiter.slot():
+            with get_http_session().get(img_url, timeout=IMAGE_TIMEOUT, stream=True) as img_response:
+                if img_response.status_code in THROTTLE_STATUS_CODES:
+                    limiter.record_throttle(parse_retry_after(img_response))
+                    if attempt + 1 < IMAGE_MAX_ATTEMPTS:
+                        continue
+                img_response.raise_for_status()
+                content = read_image_body(img_response)
+        limiter.record_success()
+        break
+    
+    if content is None or not is_valid_image(content):
+        return None
+    return content
+
+
+IMAGE_STORE_DIR = os.path.join("이미지", ".store")
+
+
+class ImageStore:
+    """
+    내용 해시(sha256)로 이미지를 한 번만 저장하는 저장소.
+    - URL → 해시 색인으로 이미 받은 URL 은 다시 다운로드하지 않음 (유효하지 않은 이미지도 기억)
+    - 상품 폴더의 0.jpg, 1.jpg... 는 저장소 파일의 하드링크 (불가능하면 복사)
+    - gc() 로 어떤 상품 폴더에서도 쓰지 않는 파일을 정리
+    """
+
+    REJECTED = ""
+
+    def __init__(self, root=IMAGE_STORE_DIR):
+        self.root = root
+        self.blob_dir = os.path.join(root, "blobs")
+        os.makedirs(self.blob_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(root, "index.sqlite3"), timeout=30, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS urls ("
+                " url TEXT PRIMARY KEY, hash TEXT NOT NULL, fetched_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS refs ("
+                " path TEXT PRIMARY KEY, hash TEXT NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS refs_hash ON refs (hash)")
+
+    def blob_path(self, digest):
+        return os.path.join(self.blob_dir, digest[:2], f"{digest}.jpg")
+
+    def lookup(self, url):
+        """
+        :return: 해시, 유효하지 않았던 이미지면 REJECTED, 처음 보는 URL 이면 None
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT hash FROM urls WHERE url = ?", (url,)).fetchone()
+        if row is None:
+            return None
+        if row[0] != self.REJECTED and not os.path.exists(self.blob_path(row[0])):
+            return None  # 파일이 지워졌다면 다시 받음
+        return row[0]
+
+    def put(self, url, content):
+        digest = hashlib.sha256(content).hexdigest()
+        path = self.blob_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        self._remember(url, digest)
+        return digest
+
+    def mark_rejected(self, url):
+        self._remember(url, self.REJECTED)
+
+    def _remember(self, url, digest):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO urls (url, hash, fetched_at) VALUES (?, ?, ?)",
+                (url, digest, time.time()),
+            )
+
+    def link(self, digest, dest_path):
+        """
+        저장소 파일을 dest_path 에 하드링크(실패 시 복사)하고 참조를 기록.
+        """
+        source = self.blob_path(digest)
+        if os.path.exists(dest_path):
+            os.remove(dest_path)
+        try:
+            os.link(source, dest_path)
+        except OSError:
+            shutil.copyfile(source, dest_path)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO refs (path, hash) VALUES (?, ?)",
+                (os.path.abspath(dest_path), digest),
+            )
+
+    def gc(self):
+        """
+        상품 폴더가 삭제되어 참조가 없는 저장소 파일과 색인을 정리.
+        :return: (삭제한 파일 수, 확보한 바이트)
+        """
+        with self._lock:
+            refs = self._conn.execute("SELECT path, hash FROM refs").fetchall()
+        stale = [(path,) for path, _ in refs if not os.path.exists(path)]
+        live = {digest for path, digest in refs if os.path.exists(path)}
+
+        removed, freed = 0, 0
+        for folder, _, files in os.walk(self.blob_dir):
+            for name in files:
+                digest = name.split(".", 1)[0]
+                if digest in live:
                     continue
-                    
-                img_path = os.path.join(folder_path, f"{idx}.jpg")
-                
-                with open(img_path, 'wb') as f:
-                    f.write(img_response.content)
-                
-                if idx == 0:
-                    thumb_path = img_path
-                
-                idx += 1
-                
-            except Exception:
-                continue
-        
-        # AI 파싱
-        if thumb_path:
+                path = os.path.join(folder, name)
+                freed += os.path.getsize(path)
+                os.remove(path)
+                removed += 1
+
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM refs WHERE path = ?", stale)
+            # 파일이 없어진 URL 은 다음에 다시 받도록 색인에서 제거 (유효하지 않은 이미지 기록은 유지)
+            hashes = [row[0] for row in self._conn.execute("SELECT DISTINCT hash FROM urls WHERE hash != ''")]
+            self._conn.executemany(
+                "DELETE FROM urls WHERE hash = ?", [(digest,) for digest in hashes if digest not in live]
+            )
+        return removed, freed
+
+
+image_store = None
+_image_store_lock = threading.Lock()
+
+
+def get_image_store():
+    global image_store
+    with _image_store_lock:
+        if image_store is None:
+            image_store = ImageStore()
+        return image_store
+
+
+def fetch_image_to_store(img_url, site_name=""):
+    """
+    이미지를 저장소에 받아두고 해시를 반환.
+    이미 아는 URL 이면 다운로드하지 않으며, 유효하지 않은 이미지는 REJECTED, 다운로드 실패는 None.
+    """
+    store = get_image_store()
+    known = store.lookup(img_url)
+    if known is not None:
+        return known
+
+    try:
+        with metrics.timer("image_download", site_name, host=urlparse(img_url).netloc) as event:
+            content = fetch_image(img_url)
+            event['bytes'] = len(content) if content else 0
+    except Exception:
+        return None
+
+    if content is None:
+        store.mark_rejected(img_url)
+        return ImageStore.REJECTED
+    return store.put(img_url, content)
+
+
+def download_images(img_urls, folder_path, site_name=""):
+    """
+    이미지를 동시에 다운로드하고 유효한 이미지만 0.jpg, 1.jpg... 순서로 저장.
+    저장 순서는 페이지의 이미지 순서를 따르므로 첫 번째 경로가 썸네일이 된다.
+    :return: 저장된 이미지 경로 리스트
+    """
+    executor = get_image_executor()
+    futures = [executor.submit(fetch_image_to_store, img_url, site_name) for img_url in img_urls]
+
+    store = get_image_store()
+    img_paths = []
+    for future in futures:
+        digest = future.result()
+        if not digest:
+            continue
+
+        img_path = os.path.join(folder_path, f"{len(img_paths)}.jpg")
+        store.link(digest, img_path)
+        img_paths.append(img_path)
+
+    return img_paths
+
+
+THUMBNAIL_SIZE = 160
+
+
+def make_thumbnail(img_path, size=THUMBNAIL_SIZE):
+    """
+    엑셀 삽입용 작은 JPEG 썸네일을 원본 옆에 만든다 (예: 0.jpg → 0.thumb.jpg).
+    이미 원본보다 최신 썸네일이 있으면 재사용.
+    :return: 썸네일 경로, 만들 수 없으면 None
+    """
+    from PIL import Image
+
+    root, _ = os.path.splitext(img_path)
+    if root.endswith(".thumb"):
+        return img_path  # 이미 썸네일 (작업 큐에서 풀어낸 경우)
+    thumb_path = f"{root}.thumb.jpg"
+    try:
+        if os.path.exists(thumb_path) and os.path.getmtime(thumb_path) >= os.path.getmtime(img_path):
+            return thumb_path
+
+        with Image.open(img_path) as img:
+            img.draft('RGB', (size, size))  # JPEG 는 디코딩 단계에서 축소
+            if img.mode in ('RGBA', 'LA', 'P'):
+                img = img.convert('RGBA')
+                background = Image.new('RGB', img.size, (255, 255, 255))
+                background.paste(img, mask=img.getchannel('A'))
+                img = background
+            elif img.mode != 'RGB':
+                img = img.convert('RGB')
+            img.thumbnail((size, size))
+            img.save(thumb_path, 'JPEG', quality=85, optimize=True)
+        return thumb_path
+    except (IOError, SyntaxError, ValueError):
+        logger.warning(f"썸네일 생성 실패: {img_path}", exc_info=True)
+        return None
+
+
+class ProductJob:
+    """
+    파이프라인 단계 사이를 오가는 상품 하나의 작업 상태.
+    """
+
+    def __init__(self, url, site_name, folder_name, row=None, item_id=None):
+        self.url = url
+        self.site_name = site_name
+        self.folder_name = folder_name
+        self.item_id = item_id  # 작업 큐 모드에서 임대한 항목 ID
+        self.row = row if row is not None else new_result_row(url, site_name, folder_name)
+        self.document = None
+        self.img_urls = []
+        self.thumb_path = ""
+        self.parsed_data = None
+        self.failed = False
+        self.success = False
+
+    def release(self, names=None):
+        """
+        다 쓴 버퍼(페이지 HTML/파싱 트리 등)를 놓아 다음 단계를 기다리는 동안 메모리를 잡지 않도록 함.
+        :param names: 놓을 속성 이름들. 주지 않으면 모든 버퍼
+        """
+        for name in JOB_BUFFERS if names is None else names:
+            if name == 'document' and self.document is not None:
+                self.document.close()
+            setattr(self, name, None)
+
+
+# 작업이 들고 있는 큰 버퍼와, 단계가 끝난 뒤 더 이상 필요 없는 버퍼
+JOB_BUFFERS = ('document', 'img_urls', 'parsed_data')
+STAGE_RELEASES = {
+    'images': ('img_urls',),
+    'parse': ('document',),
+    'assemble': ('parsed_data',),
+}
+
+
+def stage_fetch(job):
+    job.document = fetch_document(job.url, job.site_name, 'product')
+    job.img_urls = find_image_urls(job.document)
+
+
+def stage_images(job):
+    folder_path = os.path.join(f"이미지/{job.site_name}", job.folder_name)
+    os.makedirs(folder_path, exist_ok=True)
+
+    img_paths = download_images(job.img_urls, folder_path, job.site_name)
+    job.thumb_path = img_paths[0] if img_paths else ""
+
+
+def stage_parse(job):
+    # 유효한 이미지가 하나도 없는 상품은 파싱하지 않음
+    if not job.thumb_path:
+        return
+
+    known = extract_by_rules(job.document, job.site_name)
+    fields = [field for field in PROMPT_FIELDS if field not in known]
+    logger.debug(f"규칙 추출 {len(known)}개 필드, LLM 요청 {len(fields)}개 필드: {job.url}")
+
+    parsed_data = {}
+    if fields:
+        parsed_data = ai_parse(
+            reduce_html(job.document, job.site_name), url=job.url, fields=fields, known=known, site_name=job.site_name
+        )
+    job.parsed_data = {**parsed_data, **known}
+
+
+def stage_assemble(job):
+    parsed_data = job.parsed_data
+    if parsed_data is None:
+        return
+
+    job.row.update({
+        '결과': "성공",
+        '이미지': job.thumb_path,
+        '매장가': parsed_data['market_price'],
+        '단가': parsed_data['price'],
+        '성별': parsed_data['gender'],
+        '상품명': re.match(r"^\[.*?\] (.*)", str(parsed_data['kor_name'])).group(1) if re.match(r"^\[.*?\] (.*)", str(parsed_data['kor_name'])) else str(parsed_data['kor_name']),
+        '영문명': re.match(r"^\[.*?\] (.*)", str(parsed_data['eng_name'])).group(1) if re.match(r"^\[.*?\] (.*)", str(parsed_data['eng_name'])) else str(parsed_data['eng_name']),
+        '브랜드': parsed_data['brand'].upper(),
+        '2차': parsed_data['first_category'],
+        '3차': parsed_data['second_category'],
+        "추가 정보\n모델명": str(parsed_data['genuine_number']),
+        "필수옵션\n색상": ",".join(parsed_data['colors']),
+        "필수옵션\n사이즈": ",".join(parsed_data['sizes']).replace("(","[").replace(")","]")
+    })
+    job.success = True
+
+
+# 상품 처리 단계 (순서대로 실행)
+PRODUCT_STAGES = [
+    ('fetch', stage_fetch),
+    ('images', stage_images),
+    ('parse', stage_parse),
+    ('assemble', stage_assemble),
+]
+
+
+def run_stage(job, name, func):
+    """
+    단계 하나를 실행. 앞 단계에서 실패한 작업은 그대로 통과시킨다.
+    """
+    if job.failed:
+        return
+    try:
+        with metrics.timer(f"stage.{name}", job.site_name):
+            func(job)
+    except Exception:
+        logger.debug(f"[{name}] 단계 실패: {job.url}", exc_info=True)
+        job.failed = True
+        job.row['결과'] = "실패"
+        job.release()
+        return
+    job.release(STAGE_RELEASES.get(name, ()))
+
+
+def process_product(url, store_name, folder_name, row=None):
+    """
+    상품 하나를 모든 단계에 걸쳐 순서대로 처리해 결과 행을 채운다.
+    :param row: 채울 결과 행. 주지 않으면 전역 results[url] 을 갱신
+    :return: 성공 여부
+    """
+    if row is None:
+        row = results[url]
+
+    job = ProductJob(url, store_name, folder_name, row)
+    for name, func in PRODUCT_STAGES:
+        run_stage(job, name, func)
+    return job.success
+
+
+class ProductPipeline:
+    """
+    PRODUCT_STAGES 를 bounded queue 로 연결한 파이프라인.
+    단계마다 워커 수가 따로 있고, 다음 단계 큐가 가득 차면 앞 단계가 대기(backpressure)하므로
+    전체 처리량은 가장 느린 단계에 맞춰진다. 끝난 작업은 done 큐로 나온다.
+    """
+
+    _STOP = object()
+
+    def __init__(self, stage_workers, queue_size):
+        """
+        :param stage_workers: {'fetch': 4, 'images': 4, ...} 단계별 워커 수
+        :param queue_size: 단계 사이 큐의 최대 길이
+        """
+        self.done = queue.Queue()
+        self._queues = [queue.Queue(maxsize=max(1, queue_size)) for _ in PRODUCT_STAGES]
+        self._worker_counts = [max(1, stage_workers.get(name, 1)) for name, _ in PRODUCT_STAGES]
+        self._remaining = list(self._worker_counts)
+        self._lock = threading.Lock()
+        self._threads = []
+
+        for index, (name, func) in enumerate(PRODUCT_STAGES):
+            for n in range(self._worker_counts[index]):
+                thread = threading.Thread(
+                    target=self._worker, args=(index, name, func), name=f"{name}-{n}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, job):
+        """
+        첫 단계 큐에 작업을 넣는다. 큐가 가득 차면 자리가 날 때까지 대기.
+        """
+        self._queues[0].put(job)
+
+    def close(self):
+        """
+        더 이상 작업이 없음을 알림. 남은 작업이 모두 끝나면 done 큐에 종료 표시가 들어간다.
+        """
+        for _ in range(self._worker_counts[0]):
+            self._queues[0].put(self._STOP)
+
+    def results(self):
+        """
+        끝난 작업을 완료 순서대로 반환하는 제너레이터.
+        """
+        while True:
+            job = self.done.get()
+            if job is self._STOP:
+                return
+            yield job
+
+    def _worker(self, index, name, func):
+        in_queue = self._queues[index]
+        while True:
+            job = in_queue.get()
+            if job is self._STOP:
+                break
+            run_stage(job, name, func)
+            self._forward(index, job)
+
+        # 단계의 마지막 워커가 끝나면 다음 단계 워커들에게 종료를 전달
+        with self._lock:
+            self._remaining[index] -= 1
+            last = self._remaining[index] == 0
+        if last:
+            if index + 1 < len(self._queues):
+                for _ in range(self._worker_counts[index + 1]):
+                    self._queues[index + 1].put(self._STOP)
+            else:
+                self.done.put(self._STOP)
+
+    def _forward(self, index, job):
+        if index + 1 < len(self._queues):
+            self._queues[index + 1].put(job)
+        else:
+            self.done.put(job)
+
+
+def new_result_row(url, site_name, folder_name):
+    return {
+        "결과": "",
+        "상품넘버": (f'=HYPERLINK("{url}", "{folder_name}")'),
+        "거래처": site_name,
+        "단가": "",                
+        "이미지": "",
+        "1차": "",
+        "2차": "",
+        "3차": "",
+        "4차": "",
+        "필터": "",
+        "성별": "",
+        "브랜드": "",
+        "2차 브랜드": "",
+        "상품명": "",
+        "영문명": "",                
+        "추가 정보\n모델명": "",
+        "추가 정보\n배송방법": "항공특송",
+        "추가 정보\n소재": "",
+        "추가 정보\n구성품": "풀박스",
+        "매장가": "",
+        "판매가1": "",
+        "판매가2": "",
+        "판매가3": "",
+        "필수옵션\n등급선택": "",
+        "필수옵션\n사이즈": "",
+        "필수옵션\n색상": "",
+        "필수옵션\n굽높이": "",
+        "필수옵션\n버클": "",
+        "필수옵션\n도금방식": "",
+        "필수옵션\n밴드": "",
+    }
+
+
+_folder_name_lock = threading.Lock()
+_used_folder_names = set()
+
+
+def make_folder_name():
+    """
+    상품별 이미지 폴더 이름(수집 시각). 같은 초에 여러 상품이 처리되면 _1, _2 를 붙인다.
+    """
+    base = datetime.now().strftime("%Y%m%d%H%M%S")
+    with _folder_name_lock:
+        folder_name = base
+        suffix = 1
+        while folder_name in _used_folder_names:
+            folder_name = f"{base}_{suffix}"
+            suffix += 1
+        _used_folder_names.add(folder_name)
+    return folder_name
+
+
+def run_product_task(url, site_name, folder_name):
+    """
+    워커(스레드/프로세스)에서 실행되는 상품 처리 단위. 전역 상태를 건드리지 않고 결과 행을 반환.
+    워커 프로세스에서 모은 소요 시간 샘플도 함께 돌려준다.
+    """
+    row = new_result_row(url, site_name, folder_name)
+    success = process_product(url, site_name, folder_name, row)
+    return url, row, success, metrics.drain()
+
+
+def apply_runtime_settings(args):
+    """
+    명령행 옵션을 모듈 설정값에 반영. 프로세스 풀 워커에서도 같은 설정을 쓰도록 분리.
+    """
+    global LLM_CACHE_ENABLED, LLM_CACHE_TTL_SECONDS
+    global LLM_BATCH_ENABLED, LLM_BATCH_TOKEN_BUDGET, LLM_BATCH_MAX_ITEMS
+    global RULE_EXTRACTION_ENABLED, LEAN_BROWSER, CHROMEDRIVER_OFFLINE
+    global PAGE_ARCHIVE_ENABLED, PAGE_REPLAY
+    LLM_CACHE_ENABLED = not args.no_llm_cache
+    LLM_CACHE_TTL_SECONDS = int(args.llm_cache_ttl_hours * 60 * 60)
+    LLM_BATCH_ENABLED = args.llm_batch
+    LLM_BATCH_TOKEN_BUDGET = args.llm_batch_tokens
+    LLM_BATCH_MAX_ITEMS = args.llm_batch_max
+    RULE_EXTRACTION_ENABLED = not args.no_rules
+    LEAN_BROWSER = not args.full_browser
+    CHROMEDRIVER_OFFLINE = args.offline
+    PAGE_ARCHIVE_ENABLED = args.archive_pages and not args.replay
+    PAGE_REPLAY = args.replay
+
+
+def init_process_worker(args):
+    """
+    프로세스 풀 워커 초기화. 워커 종료 시 해당 프로세스의 브라우저를 정리한다.
+    fork 로 물려받은 연결·스레드 자원은 부모와 공유되면 안 되므로 버리고 새로 만든다.
+    """
+    global driver_pool, http_session, llm_cache, llm_batcher, _image_executor, image_store, _host_limiters
+    global page_archive
+    driver_pool = None
+    page_archive = None
+    metrics.drain()  # 부모의 샘플이 첫 작업 결과에 섞여 다시 합쳐지지 않도록 버림
+    http_session = None
+    llm_cache = None
+    llm_batcher = None
+    _image_executor = None
+    image_store = None
+    _host_limiters = {}
+    apply_runtime_settings(args)
+    multiprocessing.util.Finalize(None, shutdown_driver_pool, exitpriority=10)
+
+
+results_lock = threading.Lock()
+
+SEEN_INDEX_PATH = "seen_products.sqlite3"
+
+
+def extract_product_id(url):
+    """
+    상품 URL 에서 상품 ID(it_id) 추출. 없으면 URL 전체를 ID 로 사용.
+    """
+    values = parse_qs(urlparse(url).query).get('it_id')
+    return values[0] if values else url
+
+
+class SeenProductIndex:
+    """
+    사이트별로 이미 수집한 상품 ID 와 처음/마지막으로 본 시각을 저장하는 색인.
+    성공적으로 처리된 상품만 processed_at 이 기록되며, 실패한 상품은 다음 실행에서 다시 처리된다.
+    """
+
+    def __init__(self, path=SEEN_INDEX_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS seen ("
+                " site TEXT NOT NULL,"
+                " product_id TEXT NOT NULL,"
+                " url TEXT NOT NULL,"
+                " first_seen REAL NOT NULL,"
+                " last_seen REAL NOT NULL,"
+                " processed_at REAL,"
+                " PRIMARY KEY (site, product_id))"
+            )
+
+    def touch(self, site_name, urls):
+        """
+        카테고리에서 발견한 상품의 last_seen 을 갱신하고, 처음 보는 상품은 새로 등록.
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO seen (site, product_id, url, first_seen, last_seen) VALUES (?, ?, ?, ?, ?)"
+                " ON CONFLICT (site, product_id) DO UPDATE SET last_seen = excluded.last_seen, url = excluded.url",
+                [(site_name, extract_product_id(url), url, now, now) for url in urls],
+            )
+
+    def filter_new(self, site_name, urls):
+        """
+        아직 처리되지 않은 상품 URL 만 원래 순서대로 반환.
+        """
+        with self._lock:
+            processed = {
+                row[0] for row in self._conn.execute(
+                    "SELECT product_id FROM seen WHERE site = ? AND processed_at IS NOT NULL", (site_name,)
+                )
+            }
+        return [url for url in urls if extract_product_id(url) not in processed]
+
+    def mark_processed(self, site_name, url):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE seen SET processed_at = ? WHERE site = ? AND product_id = ?",
+                (time.time(), site_name, extract_product_id(url)),
+            )
+
+    def record_processed(self, items):
+        """
+        다른 곳(작업 큐)에서 처리된 상품을 기록. 이미 처리 시각이 있는 상품은 건드리지 않는다.
+        :param items: [(site, url, processed_at), ...]
+        :return: 새로 기록된 개수
+        """
+        with self._lock, self._conn:
+            cursor = self._conn.executemany(
+                "UPDATE seen SET processed_at = ? WHERE site = ? AND product_id = ? AND processed_at IS NULL",
+                [(processed_at, site_name, extract_product_id(url)) for site_name, url, processed_at in items],
+            )
+        return cursor.rowcount
+
+    def expire(self, days):
+        """
+        days 일 넘게 카테고리에서 보이지 않은 상품을 삭제 (다시 올라오면 신상품으로 처리).
+        :return: 삭제된 개수
+        """
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "DELETE FROM seen WHERE last_seen < ?", (time.time() - days * 24 * 60 * 60,)
+            )
+        return cursor.rowcount
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+JOURNAL_DIR = "journal"
+
+
+class ResultJournal:
+    """
+    상품 처리 결과를 끝나는 즉시 한 줄씩 기록하는 append-only 저널 (JSONL).
+    실행이 중단되어도 기록된 결과는 남으므로 --resume 으로 이어서 처리하거나
+    --export-journal 로 엑셀만 다시 만들 수 있다.
+    """
+
+    def __init__(self, run_id):
+        self.run_id = run_id
+        self.path = self.path_for(run_id)
+        os.makedirs(JOURNAL_DIR, exist_ok=True)
+        self._lock = threading.Lock()
+        self._file = open(self.path, 'a', encoding='utf-8')
+        # 이전 실행이 줄 중간에 중단됐다면 새 기록이 잘린 줄에 이어 붙지 않도록 줄바꿈
+        if self._file.tell() > 0:
+            with open(self.path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    self._file.write("\n")
+
+    @staticmethod
+    def path_for(run_id):
+        return os.path.join(JOURNAL_DIR, f"run_{run_id}.jsonl")
+
+    def record(self, url, row, success):
+        self._write({"type": "result", "url": url, "success": success, "row": row, "at": time.time()})
+
+    def record_queued(self, site_name, urls):
+        """
+        처리할 상품 URL 을 등록 순서대로 기록. 엑셀 행 순서를 결과가 끝난 순서가 아닌 이 순서로 맞춘다.
+        """
+        if urls:
+            self._write({"type": "queued", "site": site_name, "urls": list(urls), "at": time.time()})
+
+    def mark_complete(self):
+        self._write({"type": "complete", "at": time.time()})
+
+    def _write(self, entry):
+        line = json.dumps(entry, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    @classmethod
+    def entries(cls, run_id):
+        """
+        저널 항목을 순서대로 반환. 기록 도중 중단되어 잘린 마지막 줄은 건너뜀.
+        """
+        with open(cls.path_for(run_id), 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"저널의 손상된 줄을 건너뜁니다: {line[:80]!r}")
+
+    @classmethod
+    def load(cls, run_id):
+        """
+        :return: ({url: (row, success)}, 정상 종료 여부). 같은 URL 은 마지막 기록이 우선.
+        """
+        outcomes = {}
+        completed = False
+        for entry in cls.entries(run_id):
+            if entry.get("type") == "result":
+                outcomes[entry["url"]] = (entry["row"], entry["success"])
+            elif entry.get("type") == "complete":
+                completed = True
+        return outcomes, completed
+
+    @classmethod
+    def load_status(cls, run_id):
+        """
+        load() 와 같지만 행은 버리고 성공 여부만 모은다 (저메모리 모드의 이어서 처리용).
+        :return: ({url: success}, 정상 종료 여부)
+        """
+        statuses = {}
+        completed = False
+        for entry in cls.entries(run_id):
+            if entry.get("type") == "result":
+                statuses[entry["url"]] = entry["success"]
+            elif entry.get("type") == "complete":
+                completed = True
+        return statuses, completed
+
+    @staticmethod
+    def list_runs():
+        if not os.path.isdir(JOURNAL_DIR):
+            return []
+        return sorted(
+            name[len("run_"):-len(".jsonl")]
+            for name in os.listdir(JOURNAL_DIR)
+            if name.startswith("run_") and name.endswith(".jsonl")
+        )
+
+    @classmethod
+    def resolve_run_id(cls, run_id, incomplete_only=False):
+        """
+        'latest' 를 실제 실행 ID 로 변환. incomplete_only 면 정상 종료되지 않은 가장 최근 실행.
+        """
+        if run_id != 'latest':
+            if not os.path.exists(cls.path_for(run_id)):
+                raise FileNotFoundError(f"저널을 찾을 수 없습니다: {cls.path_for(run_id)}")
+            return run_id
+
+        for candidate in reversed(cls.list_runs()):
+            if not incomplete_only or not cls.load_status(candidate)[1]:
+                return candidate
+        raise FileNotFoundError("이어서 처리할 저널이 없습니다.")
+
+
+def iter_journal_rows(run_id):
+    """
+    저널에 기록된 결과 행을 상품 등록 순서대로 하나씩 읽어 반환 (엑셀 생성용).
+    행 전체를 메모리에 올리지 않도록 먼저 URL 별 마지막 결과 줄의 위치만 모으고,
+    그 위치를 차례로 다시 읽는다.
+    """
+    path = ResultJournal.path_for(run_id)
+    order = {}    # url → 등록 순번 (queued 기록이 없으면 결과가 처음 나온 순서)
+    offsets = {}  # url → 마지막 result 줄의 파일 위치
+
+    with open(path, 'rb') as f:
+        while True:
+            offset = f.tell()
+            line = f.readline()
+            if not line:
+                break
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # 기록 도중 잘린 줄
+            if entry.get("type") == "queued":
+                for url in entry["urls"]:
+                    order.setdefault(url, len(order))
+            elif entry.get("type") == "result":
+                order.setdefault(entry["url"], len(order))
+                offsets[entry["url"]] = offset
+
+    with open(path, 'rb') as f:
+        for url in sorted(offsets, key=order.__getitem__):
+            f.seek(offsets[url])
+            yield json.loads(f.readline())["row"]
+
+
+WORK_QUEUE_PATH = "work_queue.sqlite3"
+QUEUE_LEASE_SECONDS = 10 * 60   # 이 시간 안에 ack 하지 않은 상품은 다른 워커가 다시 가져감
+QUEUE_MAX_ATTEMPTS = 3          # 임대가 이 횟수만큼 만료된 상품은 실패로 처리 (워커를 계속 죽이는 상품)
+QUEUE_POLL_SECONDS = 5
+
+
+class WorkQueue:
+    """
+    여러 워커 프로세스(또는 공유 디스크의 여러 PC)가 나눠 처리하는 상품 작업 큐 (SQLite).
+    WAL 은 네트워크 파일시스템에서 동작하지 않으므로 다른 색인과 달리 rollback journal 을 쓴다.
+    - --enqueue 가 카테고리에서 찾은 상품을 실행 ID 별로 넣는다 (폴더 이름도 이때 정해 워커끼리 겹치지 않음)
+    - 워커는 상품을 임대(lease)해 처리하고 결과 행과 함께 ack 한다
+    - 임대 기한이 지나도록 ack 되지 않은 상품(워커가 죽은 경우)은 다시 대기 상태가 된다
+    - --finalize 는 ack 된 결과 행을 넣은 순서대로 읽어 엑셀을 만든다
+    - 처리 완료 기록(seen_products)은 워커가 아니라 색인을 가진 PC 의 --enqueue / --finalize 가 큐에서 옮긴다
+    - 이미지 폴더는 워커 PC 에 남으므로 엑셀용 썸네일은 결과 행과 함께 큐에 저장한다
+    큐 파일만 공유하고 워커는 각자 로컬 작업 폴더에서 실행해야 한다
+    (이미지 저장소, LLM 캐시 등 다른 SQLite 파일은 WAL 을 쓰므로 공유 디스크에 두면 안 됨).
+    """
+
+    PENDING = "pending"
+    LEASED = "leased"
+    DONE = "done"
+
+    def __init__(self, path=WORK_QUEUE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        # 임대는 BEGIN IMMEDIATE 로 직접 트랜잭션을 잡아야 하므로 autocommit 모드로 연결
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=DELETE")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS runs ("
+                " run_id TEXT PRIMARY KEY, created_at REAL NOT NULL, record_seen INTEGER NOT NULL DEFAULT 1)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS items ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " run_id TEXT NOT NULL, site TEXT NOT NULL, url TEXT NOT NULL, folder TEXT NOT NULL,"
+                " state TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0,"
+                " owner TEXT, lease_expires REAL, success INTEGER, row TEXT, thumbnail BLOB,"
+                " updated_at REAL NOT NULL,"
+                " UNIQUE (run_id, url))"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS items_state ON items (run_id, state, site)")
+
+    def create_run(self, run_id, record_seen=True):
+        """
+        :param record_seen: False 면 이 실행의 결과를 수집 기록에 옮기지 않음 (--replay)
+        """
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO runs (run_id, created_at, record_seen) VALUES (?, ?, ?)",
+                (run_id, time.time(), int(record_seen)),
+            )
+
+    def resolve_run_id(self, run_id):
+        """
+        'latest' 를 가장 최근에 만든 실행 ID 로 변환.
+        """
+        with self._lock:
+            if run_id == 'latest':
+                row = self._conn.execute("SELECT run_id FROM runs ORDER BY created_at DESC LIMIT 1").fetchone()
+            else:
+                row = self._conn.execute("SELECT run_id FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        if row is None:
+            raise FileNotFoundError(f"작업 큐({self.path})에 실행 {run_id} 가 없습니다.")
+        return row[0]
+
+    def enqueue(self, run_id, site_name, jobs):
+        """
+        (url, folder_name) 목록을 대기 상태로 추가. 이미 들어 있는 URL 은 무시.
+        :return: 새로 추가된 상품 수
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                cursor = self._conn.executemany(
+                    "INSERT OR IGNORE INTO items (run_id, site, url, folder, state, updated_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    [(run_id, site_name, url, folder_name, self.PENDING, now) for url, folder_name in jobs],
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            return cursor.rowcount
+
+    def lease(self, run_id, owner, site_name, lease_seconds=QUEUE_LEASE_SECONDS, exclude=()):
+        """
+        사이트의 대기 상품 하나를 임대. 기한이 지난 임대는 먼저 대기 상태로 되돌린다.
+        :param exclude: 임대하지 않을 item_id (이 프로세스에서 아직 처리 중인 상품)
+        :return: (item_id, url, folder_name), 가져갈 상품이 없으면 None
+        """
+        exclude = list(exclude)
+        excluded = f" AND id NOT IN ({', '.join('?' * len(exclude))})" if exclude else ""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "UPDATE items SET state = ?, owner = NULL, lease_expires = NULL"
+                    " WHERE run_id = ? AND state = ? AND lease_expires < ?",
+                    (self.PENDING, run_id, self.LEASED, now),
+                )
+                while True:
+                    item = self._conn.execute(
+                        "SELECT id, url, folder, attempts FROM items"
+                        f" WHERE run_id = ? AND site = ? AND state = ?{excluded} ORDER BY id LIMIT 1",
+                        (run_id, site_name, self.PENDING, *exclude),
+                    ).fetchone()
+                    if item is None:
+                        break
+                    item_id, url, folder_name, attempts = item
+                    if attempts < QUEUE_MAX_ATTEMPTS:
+                        self._conn.execute(
+                            "UPDATE items SET state = ?, owner = ?, lease_expires = ?, attempts = attempts + 1,"
+                            " updated_at = ? WHERE id = ?",
+                            (self.LEASED, owner, now + lease_seconds, now, item_id),
+                        )
+                        break
+                    # 처리하던 워커가 매번 죽은 상품 — 더 임대하지 않고 실패로 기록
+                    logger.warning(f"임대가 {attempts}번 만료되어 실패로 처리: {url}")
+                    row = new_result_row(url, site_name, folder_name)
+                    row['결과'] = "실패"
+                    self._finish(item_id, row, False, now)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        if item is None:
+            return None
+        return item_id, url, folder_name
+
+    def ack(self, item_id, row, success, thumbnail=None):
+        """
+        처리 결과를 기록. 임대가 만료돼 다른 워커가 가져갔더라도 먼저 끝낸 쪽의 결과를 쓴다.
+        :param thumbnail: 엑셀용 썸네일 JPEG 바이트 (--finalize 를 다른 PC 에서 실행할 때 사용)
+        :return: 기록했으면 True, 이미 다른 워커가 끝낸 상품이면 False
+        """
+        with self._lock:
+            return self._finish(item_id, row, success, time.time(), thumbnail) == 1
+
+    def _finish(self, item_id, row, success, now, thumbnail=None):
+        cursor = self._conn.execute(
+            "UPDATE items SET state = ?, owner = NULL, lease_expires = NULL, success = ?, row = ?, thumbnail = ?,"
+            " updated_at = ? WHERE id = ? AND state != ?",
+            (self.DONE, int(success), json.dumps(row, ensure_ascii=False), thumbnail, now, item_id, self.DONE),
+        )
+        return cursor.rowcount
+
+    def pending_sites(self, run_id):
+        """
+        지금 임대할 수 있는 상품(대기 중이거나 임대 기한이 지난)이 있는 사이트 목록.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT DISTINCT site FROM items WHERE run_id = ?"
+                " AND (state = ? OR (state = ? AND lease_expires < ?)) ORDER BY site",
+                (run_id, self.PENDING, self.LEASED, time.time()),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def counts(self, run_id):
+        """
+        :return: {'pending': n, 'leased': n, 'done': n, 'success': n}
+        """
+        counts = {self.PENDING: 0, self.LEASED: 0, self.DONE: 0, 'success': 0}
+        with self._lock:
+            for state, count, succeeded in self._conn.execute(
+                "SELECT state, COUNT(*), SUM(success) FROM items WHERE run_id = ? GROUP BY state", (run_id,)
+            ):
+                counts[state] = count
+                if state == self.DONE:
+                    counts['success'] = succeeded or 0
+        return counts
+
+    def succeeded(self, run_id=None):
+        """
+        성공으로 ack 된 상품의 (site, url, ack 시각) 목록. run_id 가 없으면 모든 실행.
+        """
+        query = (
+            "SELECT i.site, i.url, i.updated_at FROM items i JOIN runs r ON r.run_id = i.run_id"
+            " WHERE i.state = ? AND i.success = 1 AND r.record_seen = 1"
+        )
+        params = [self.DONE]
+        if run_id is not None:
+            query += " AND i.run_id = ?"
+            params.append(run_id)
+        with self._lock:
+            return self._conn.execute(query, params).fetchall()
+
+    def iter_rows(self, run_id):
+        """
+        끝난 상품의 (결과 행, 썸네일 바이트) 를 큐에 넣은 순서대로 하나씩 반환 (엑셀 생성용).
+        """
+        # 읽는 동안 다른 메서드가 같은 연결을 쓰지 않도록 별도 연결 사용
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            for row, thumbnail in conn.execute(
+                "SELECT row, thumbnail FROM items WHERE run_id = ? AND state = ? ORDER BY id", (run_id, self.DONE)
+            ):
+                yield json.loads(row), thumbnail
+        finally:
+            conn.close()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="거래처 신상품 수집기")
+    parser.add_argument("--workers", type=int, default=4,
+                        help="동시에 처리할 상품 수 (기본 4)")
+    parser.add_argument("--process-pool", action="store_true",
+                        help="스레드 대신 프로세스 풀로 상품 처리")
+    parser.add_argument("--site-concurrency", type=int, default=None,
+                        help="사이트 하나에 동시에 보내는 상품 처리 수 상한 (기본: --workers)")
+    parser.add_argument("--image-workers", type=int, default=None,
+                        help="이미지 다운로드 단계 워커 수 (기본: 페이지 로드 워커 수)")
+    parser.add_argument("--parse-workers", type=int, default=None,
+                        help="LLM 파싱 단계 워커 수 (기본: 페이지 로드 워커 수 x 2, --llm-batch 면 배치 최대 상품 수 x 동시 배치 수)")
+    parser.add_argument("--queue-size", type=int, default=None,
+                        help="단계 사이 대기열 길이 (기본: 페이지 로드 워커 수 x 2)")
+    parser.add_argument("--no-llm-cache", action="store_true",
+                        help="LLM 응답 캐시를 사용하지 않음")
+    parser.add_argument("--llm-cache-ttl-hours", type=float, default=LLM_CACHE_TTL_SECONDS / 3600,
+                        help="LLM 캐시 유효 시간 (시간 단위, 기본 336)")
+    parser.add_argument("--llm-batch", action="store_true",
+                        help="동시에 처리 중인 여러 상품을 한 번의 LLM 요청으로 파싱 (--process-pool 과 함께 쓸 수 없음)")
+    parser.add_argument("--llm-batch-tokens", type=int, default=LLM_BATCH_TOKEN_BUDGET,
+                        help="배치 하나의 입력 토큰 예산 (기본 60000)")
+    parser.add_argument("--llm-batch-max", type=int, default=LLM_BATCH_MAX_ITEMS,
+                        help="배치 하나에 담을 최대 상품 수 (기본 12)")
+    parser.add_argument("--refresh", action="store_true",
+                        help="이미 수집한 상품도 모두 다시 처리 (기본: 새 상품만 처리)")
+    parser.add_argument("--expire-days", type=float, default=None,
+                        help="이 기간(일) 동안 카테고리에서 보이지 않은 상품을 수집 기록에서 삭제")
+    parser.add_argument("--resume", nargs="?", const="latest", default=None, metavar="RUN_ID",
+                        help="중단된 실행을 이어서 처리 (RUN_ID 생략 시 가장 최근의 미완료 실행)")
+    parser.add_argument("--retry-failed", action="store_true",
+                        help="--resume 시 실패했던 상품도 다시 처리")
+    parser.add_argument("--export-journal", nargs="?", const="latest", default=None, metavar="RUN_ID",
+                        help="저널만으로 엑셀 파일을 다시 만들고 종료 (RUN_ID 생략 시 가장 최근 실행)")
+    parser.add_argument("--gc-images", action="store_true",
+                        help="상품 폴더에서 더 이상 쓰지 않는 이미지 저장소 파일을 정리하고 종료")
+    parser.add_argument("--no-rules", action="store_true",
+                        help="규칙 기반 추출을 끄고 모든 필드를 LLM 으로 추출")
+    parser.add_argument("--full-browser", action="store_true",
+                        help="headless/리소스 차단 없이 일반 Chrome 으로 로드 (사이트가 가벼운 모드를 막을 때)")
+    parser.add_argument("--offline", action="store_true",
+                        help="chromedriver 버전 확인/다운로드 없이 캐시 또는 PATH 의 드라이버만 사용")
+    parser.add_argument("--low-memory", action="store_true",
+                        help="결과 행을 메모리에 모으지 않고 저널에만 기록한 뒤 저널에서 엑셀을 만듦 (상품 수가 많을 때)")
+    parser.add_argument("--archive-pages", action="store_true",
+                        help=f"가져온 페이지 HTML 을 압축해 {PAGE_ARCHIVE_PATH} 에 보관 (--replay 용)")
+    parser.add_argument("--replay", action="store_true",
+                        help="브라우저/네트워크 없이 보관된 페이지로 추출과 엑셀 생성만 다시 실행 (수집 기록은 건드리지 않음)")
+    parser.add_argument("--enqueue", action="store_true",
+                        help="카테고리에서 찾은 상품을 작업 큐에 넣고 종료 (처리는 --worker 로)")
+    parser.add_argument("--worker", nargs="?", const="latest", default=None, metavar="RUN_ID",
+                        help="작업 큐의 상품을 임대해 처리 (여러 프로세스/PC 에서 동시에 실행 가능, RUN_ID 생략 시 가장 최근 큐)")
+    parser.add_argument("--finalize", nargs="?", const="latest", default=None, metavar="RUN_ID",
+                        help="작업 큐에 기록된 결과로 엑셀 파일을 만들고 성공한 상품을 수집 기록에 반영한 뒤 종료 (--enqueue 와 같은 PC 에서 실행, 다른 PC 워커의 이미지는 큐에 저장된 썸네일로 삽입)")
+    parser.add_argument("--queue-db", default=WORK_QUEUE_PATH,
+                        help=f"작업 큐 파일 경로 (기본 {WORK_QUEUE_PATH}, 여러 PC 가 쓰려면 파일 잠금을 지원하는 공유 디스크에 둘 것)")
+    parser.add_argument("--lease-seconds", type=float, default=QUEUE_LEASE_SECONDS,
+                        help="워커가 상품을 임대하는 시간 (초). 이 안에 끝내지 못하면 다른 워커가 다시 가져감")
+    parser.add_argument("--metrics-file", default=None,
+                        help="실행 종료 시 단계별 소요 시간 요약을 Prometheus 텍스트 형식으로 저장할 경로")
+    args = parser.parse_args(argv)
+    if args.worker and args.process_pool:
+        parser.error("--worker 는 --process-pool 과 함께 쓸 수 없습니다 (워커 프로세스를 여러 개 실행하세요)")
+    if args.llm_batch and args.process_pool:
+        # 프로세스마다 배치기가 따로 있어 상품 하나씩만 모이므로 매번 linger 시간만 기다리게 됨
+        parser.error("--llm-batch 는 --process-pool 과 함께 쓸 수 없습니다 (스레드 모드에서 사용하세요)")
+    return args
+
+
+def get_stage_workers(args, site_workers):
+    if args.llm_batch:
+        # 파싱 워커는 배치 결과를 기다리며 막혀 있으므로, 워커 수가 배치 크기 x 동시 배치 수보다 적으면
+        # 배치가 차지 못하고 매번 linger 시간만큼 기다리게 된다
+        parse_workers = args.llm_batch_max * LLM_BATCH_MAX_IN_FLIGHT
+    else:
+        # LLM 응답 대기가 가장 길어 기본값을 넉넉히
+        parse_workers = site_workers * 2
+    return {
+        'fetch': site_workers,
+        'images': args.image_workers or site_workers,
+        'parse': args.parse_workers or parse_workers,
+        'assemble': 1,
+    }
+
+
+def iter_pipeline_jobs(args, jobs, site_workers):
+    """
+    ProductJob 들을 스레드 파이프라인으로 처리하고 끝난 작업을 완료 순서대로 반환.
+    jobs 는 별도 스레드에서 읽으므로 파이프라인이 찰 때까지만 앞서 읽는다.
+    """
+    pipeline = ProductPipeline(get_stage_workers(args, site_workers), args.queue_size or site_workers * 2)
+
+    def feed():
+        for job in jobs:
+            pipeline.submit(job)
+        pipeline.close()
+
+    feeder = threading.Thread(target=feed, name="pipeline-feeder", daemon=True)
+    feeder.start()
+    yield from pipeline.results()
+    feeder.join()
+
+
+def iter_pipeline_outcomes(args, site_name, jobs, site_workers):
+    """
+    스레드 파이프라인으로 상품을 처리하고 (url, row, success) 를 완료 순서대로 반환.
+    """
+    product_jobs = (ProductJob(url, site_name, folder_name) for url, folder_name in jobs)
+    for job in iter_pipeline_jobs(args, product_jobs, site_workers):
+        yield job.url, job.row, job.success
+
+
+def iter_process_pool_outcomes(args, site_name, jobs, site_workers):
+    """
+    프로세스 풀에서 상품별로 process_product 를 실행하고 (url, row, success) 를 완료 순서대로 반환.
+    """
+    with ProcessPoolExecutor(max_workers=site_workers, initializer=init_process_worker, initargs=(args,)) as executor:
+        futures = {
+            executor.submit(run_product_task, url, site_name, folder_name): (url, folder_name)
+            for url, folder_name in jobs
+        }
+        for future in as_completed(futures):
+            # 끝난 future 를 놓아 결과 행이 실행 내내 메모리에 남지 않도록 함
+            url, folder_name = futures.pop(future)
             try:
-                parsed_data = ai_parse(html_data)
-                results[url].update({
-                    '결과': "성공",
-                    '이미지': thumb_path,
-                    '매장가': parsed_data['market_price'],
-                    '단가': parsed_data['price'],
-                    '성별': parsed_data['gender'],
-                    '상품명': re.match(r"^\[.*?\] (.*)", str(parsed_data['kor_name'])).group(1) if re.match(r"^\[.*?\] (.*)", str(parsed_data['kor_name'])) else str(parsed_data['kor_name']),
-                    '영문명': re.match(r"^\[.*?\] (.*)", str(parsed_data['eng_name'])).group(1) if re.match(r"^\[.*?\] (.*)", str(parsed_data['eng_name'])) else str(parsed_data['eng_name']),
-                    '브랜드': parsed_data['brand'].upper(),
-                    '2차': parsed_data['first_category'],
-                    '3차': parsed_data['second_category'],
-                    "추가 정보\n모델명": str(parsed_data['genuine_number']),
-                    "필수옵션\n색상": ",".join(parsed_data['colors']),
-                    "필수옵션\n사이즈": ",".join(parsed_data['sizes']).replace("(","[").replace(")","]")
-                })
-                success = True
+                url, row, success, samples = future.result()
             except Exception:
-                results[url]['결과'] = "실패"
-    except Exception:
-        results[url]['결과'] = "실패"
-    finally:
-        driver.quit()
-        
-    return success
+                logger.error(f"상품 처리 중 오류: {url}", exc_info=True)
+                row = new_result_row(url, site_name, folder_name)
+                row['결과'] = "실패"
+                yield url, row, False
+                continue
+            metrics.merge(samples)
+            yield url, row, success
+
 
-def main():
+def select_product_urls(args, seen_index, site_name, product_urls, done_urls=()):
+    """
+    카테고리에서 모은 URL 중 이번 실행에서 처리할 상품만 남긴다.
+    (수집 기록의 새 상품, 이어서 처리 시 이전 실행에서 끝난 상품 제외)
+    """
+    # 재실행(--replay)은 보관된 페이지를 다시 추출할 뿐이므로 수집 기록을 읽거나 바꾸지 않음
+    if not args.replay:
+        seen_index.touch(site_name, product_urls)
+    if not args.refresh and not args.replay:
+        listed_count = len(product_urls)
+        product_urls = seen_index.filter_new(site_name, product_urls)
+        print(f"[{site_name}] 새 상품 {len(product_urls)}개 (이미 수집한 상품 {listed_count - len(product_urls)}개 제외)")
+
+    if done_urls:
+        skipped = [url for url in product_urls if url in done_urls]
+        product_urls = [url for url in product_urls if url not in done_urls]
+        print(f"[{site_name}] 이전 실행에서 처리된 {len(skipped)}개 상품 건너뜀")
+    return product_urls
+
+
+def main(args=None):
+    global driver_pool, timestamp
+    if args is None:
+        args = parse_args([])
+    apply_runtime_settings(args)
+
+    workers = max(1, args.workers)
+    site_workers = min(workers, args.site_concurrency or workers)
     total_processed = 0
+
+    # 이어서 처리할 경우 이전 실행의 결과를 불러오고 같은 실행 ID(파일 이름)를 사용
+    done_urls = set()
+    if args.resume:
+        timestamp = ResultJournal.resolve_run_id(args.resume, incomplete_only=True)
+        if args.low_memory:
+            statuses, _ = ResultJournal.load_status(timestamp)
+        else:
+            outcomes, _ = ResultJournal.load(timestamp)
+            statuses = {}
+            for url, (row, success) in outcomes.items():
+                results[url] = row
+                statuses[url] = success
+        for url, success in statuses.items():
+            if success or not args.retry_failed:
+                done_urls.add(url)
+        logger.info(f"실행 {timestamp} 이어서 처리: 기록된 결과 {len(statuses)}개, 건너뛸 상품 {len(done_urls)}개")
+    journal = ResultJournal(timestamp)
+
+    seen_index = SeenProductIndex()
+    if args.expire_days is not None:
+        expired = seen_index.expire(args.expire_days)
+        logger.info(f"{args.expire_days}일 동안 보이지 않은 상품 {expired}개를 수집 기록에서 삭제")
+
+    # 스레드 모드에서는 워커 수만큼 브라우저를 풀링 (프로세스 모드는 프로세스마다 1개)
+    if not args.process_pool and not args.replay:
+        driver_pool = DriverPool(max_size=site_workers)
     
-    for site_name, category_name, category_url in category_data:
-        logger.info(f"\n[{site_name}] 신상품 URL 수집 중...")
-        
-        product_urls = get_product_urls(category_url, site_name)
-        url_count = len(product_urls)
+    try:
+        for site_name, category_name, category_url in get_category_data():
+            logger.info(f"\n[{site_name}] 신상품 URL 수집 중...")
         
-        print(f"[{site_name}] {url_count}개의 상품 URL 수집 완료")
-        print(f"[{site_name}] 상품 정보 수집 시작...")
+            with metrics.timer("category_urls", site_name):
+                product_urls = get_product_urls(category_url, site_name)
+            print(f"[{site_name}] {len(product_urls)}개의 상품 URL 수집 완료")
+
+            product_urls = select_product_urls(args, seen_index, site_name, product_urls, done_urls)
+            url_count = len(product_urls)
         
-        success_count = 0
-        fail_count = 0
+            print(f"[{site_name}] 상품 정보 수집 시작...")
         
-        for url in tqdm(product_urls, desc=f"{site_name} 처리중"):
-            folder_name = datetime.now().strftime("%Y%m%d%H%M%S")
-            
-            results[url] = {
-                "결과": "",
-                "상품넘버": (f'=HYPERLINK("{url}", "{folder_name}")'),
-                "거래처": site_name,
-                "단가": "",                
-                "이미지": "",
-                "1차": "",
-                "2차": "",
-                "3차": "",
-                "4차": "",
-                "필터": "",
-                "성별": "",
-                "브랜드": "",
-                "2차 브랜드": "",
-                "상품명": "",
-                "영문명": "",                
-                "추가 정보\n모델명": "",
-                "추가 정보\n배송방법": "항공특송",
-                "추가 정보\n소재": "",
-                "추가 정보\n구성품": "풀박스",
-                "매장가": "",
-                "판매가1": "",
-                "판매가2": "",
-                "판매가3": "",
-                "필수옵션\n등급선택": "",
-                "필수옵션\n사이즈": "",
-                "필수옵션\n색상": "",
-                "필수옵션\n굽높이": "",
-                "필수옵션\n버클": "",
-                "필수옵션\n도금방식": "",
-                "필수옵션\n밴드": "",
-            }
-            
-            if process_product(url, site_name, folder_name):
-                success_count += 1
+            success_count = 0
+            fail_count = 0
+
+            jobs = []
+            for url in product_urls:
+                folder_name = make_folder_name()
+                # 엑셀 행 순서를 URL 순서로 유지하기 위해 기본 행을 먼저 등록 (저메모리 모드는 저널의 등록 순서 사용)
+                if not args.low_memory:
+                    with results_lock:
+                        results[url] = new_result_row(url, site_name, folder_name)
+                jobs.append((url, folder_name))
+            journal.record_queued(site_name, product_urls)
+
+            if args.process_pool:
+                outcomes = iter_process_pool_outcomes(args, site_name, jobs, site_workers)
             else:
-                fail_count += 1
+                outcomes = iter_pipeline_outcomes(args, site_name, jobs, site_workers)
+
+            with tqdm(total=url_count, desc=f"{site_name} 처리중") as progress:
+                for url, row, success in outcomes:
+                    if not args.low_memory:
+                        with results_lock:
+                            results[url] = row
+                    journal.record(url, row, success)
+                    if success and not args.replay:
+                        seen_index.mark_processed(site_name, url)
+
+                    if success:
+                        success_count += 1
+                    else:
+                        fail_count += 1
+                    progress.update(1)
         
-        total_processed += url_count
-        print(f"\n[{site_name}] 처리 완료")
-        print(f"성공: {success_count}개")
-        print(f"실패: {fail_count}개")
-    
+            total_processed += url_count
+            print(f"\n[{site_name}] 처리 완료")
+            print(f"성공: {success_count}개")
+            print(f"실패: {fail_count}개")
+
+        journal.mark_complete()
+    finally:
+        # 임대 중이던 브라우저까지 모두 종료
+        shutdown_driver_pool()
+        shutdown_image_executor()
+        shutdown_llm_batcher()
+        journal.close()
+        seen_index.close()
+
     print(f"\n전체 처리 완료")
     print(f"총 처리 상품 수: {total_processed}개")
     
     return results
 
+def run_enqueue(args):
+    """
+    작업 큐 모드 1단계: 카테고리에서 상품 URL 을 모아 새 실행 ID 로 큐에 넣는다.
+    :return: 실행 ID
+    """
+    apply_runtime_settings(args)
+    work_queue = WorkQueue(args.queue_db)
+    seen_index = SeenProductIndex()
+
+    try:
+        # 이전 실행에서 워커가 끝낸 상품을 먼저 기록해야 새 상품만 다시 넣는다 (--finalize 를 건너뛴 경우)
+        recorded = seen_index.record_processed(work_queue.succeeded())
+        if recorded:
+            logger.info(f"작업 큐에서 처리 완료된 상품 {recorded}개를 수집 기록에 반영")
+        work_queue.create_run(timestamp, record_seen=not args.replay)
+
+        for site_name, category_name, category_url in get_category_data():
+            with metrics.timer("category_urls", site_name):
+                product_urls = get_product_urls(category_url, site_name)
+            product_urls = select_product_urls(args, seen_index, site_name, product_urls)
+            added = work_queue.enqueue(timestamp, site_name, [(url, make_folder_name()) for url in product_urls])
+            print(f"[{site_name}] 상품 {added}개를 작업 큐에 추가")
+    finally:
+        shutdown_driver_pool()
+        seen_index.close()
+        work_queue.close()
+
+    print(f"작업 큐 {args.queue_db} 에 실행 {timestamp} 등록 완료 (--worker {timestamp} 로 처리)")
+    return timestamp
+
+
+def run_worker(args):
+    """
+    작업 큐 모드 2단계: 큐가 빌 때까지 상품을 하나씩 임대해 파이프라인으로 처리하고 ack 한다.
+    상품은 파이프라인에 들어갈 때 임대하므로 먼저 임대해 두고 묵히지 않는다.
+    다른 워커가 아직 처리 중인 상품이 있으면 끝나거나 임대가 만료될 때까지 기다린다.
+    수집 기록은 다른 PC 에 있을 수 있으므로 여기서는 건드리지 않는다 (--finalize / 다음 --enqueue 가 반영).
+    :return: (성공 수, 실패 수)
+    """
+    global driver_pool
+    apply_runtime_settings(args)
+    site_workers = min(max(1, args.workers), args.site_concurrency or args.workers)
+    work_queue = WorkQueue(args.queue_db)
+    run_id = work_queue.resolve_run_id(args.worker)
+    owner = f"{socket.gethostname()}:{os.getpid()}"
+    if not args.replay:
+        driver_pool = DriverPool(max_size=site_workers)
+
+    success_count = 0
+    fail_count = 0
+    try:
+        while True:
+            sites = work_queue.pending_sites(run_id)
+            if not sites:
+                if work_queue.counts(run_id)[WorkQueue.LEASED]:
+                    time.sleep(QUEUE_POLL_SECONDS)
+                    continue
+                break
+
+            for site_name in sites:
+                in_flight = set()  # 이 프로세스의 파이프라인에 들어가 있는 item_id
+
+                def lease_jobs():
+                    while True:
+                        # 처리 중에 임대가 만료된 자기 상품은 다시 받지 않음 (같은 상품이 파이프라인에 두 번 들어감)
+                        item = work_queue.lease(run_id, owner, site_name, args.lease_seconds, exclude=set(in_flight))
+                        if item is None:
+                            return
+                        item_id, url, folder_name = item
+                        in_flight.add(item_id)
+                        yield ProductJob(url, site_name, folder_name, item_id=item_id)
+
+                with tqdm(desc=f"{site_name} 처리중") as progress:
+                    for job in iter_pipeline_jobs(args, lease_jobs(), site_workers):
+                        in_flight.discard(job.item_id)
+                        if not work_queue.ack(job.item_id, job.row, job.success, read_thumbnail(job.row['이미지'])):
+                            logger.warning(f"다른 워커가 먼저 처리한 상품이라 결과를 버립니다: {job.url}")
+                            continue
+                        if job.success:
+                            success_count += 1
+                        else:
+                            fail_count += 1
+                        progress.update(1)
+    finally:
+        shutdown_driver_pool()
+        shutdown_image_executor()
+        shutdown_llm_batcher()
+        work_queue.close()
+
+    print(f"워커 {owner} 종료: 성공 {success_count}개, 실패 {fail_count}개")
+    return success_count, fail_count
+
+
+def run_finalize(args):
+    """
+    작업 큐 모드 3단계: 큐에 기록된 결과 행으로 사이트별 엑셀 파일을 만들고,
+    성공한 상품을 이 PC 의 수집 기록에 처리 완료로 반영한다.
+    :return: 저장한 엑셀 파일 목록
+    """
+    work_queue = WorkQueue(args.queue_db)
+    try:
+        run_id = work_queue.resolve_run_id(args.finalize)
+        seen_index = SeenProductIndex()
+        try:
+            recorded = seen_index.record_processed(work_queue.succeeded(run_id))
+        finally:
+            seen_index.close()
+        print(f"수집 기록에 처리 완료 {recorded}개 반영")
+        counts = work_queue.counts(run_id)
+        unfinished = counts[WorkQueue.PENDING] + counts[WorkQueue.LEASED]
+        if unfinished:
+            print(f"경고: 아직 처리되지 않은 상품 {unfinished}개는 엑셀에서 빠집니다.")
+        print(f"실행 {run_id}: 완료 {counts[WorkQueue.DONE]}개 (성공 {counts['success']}개)")
+
+        missing = 0
+
+        def rows_with_local_images():
+            nonlocal missing
+            for row, thumbnail in work_queue.iter_rows(run_id):
+                img_path = row['이미지']
+                if img_path and not os.path.exists(img_path):
+                    # 다른 PC 의 워커가 처리한 상품 — 큐에 저장된 썸네일을 이 PC 에 풀어서 사용
+                    if thumbnail:
+                        row['이미지'] = restore_thumbnail(img_path, thumbnail)
+                    else:
+                        missing += 1
+                yield row
+
+        excel_filenames = export_results(rows_with_local_images(), run_timestamp=run_id)
+        if missing:
+            print(f"경고: 이미지 파일도 저장된 썸네일도 없어 {missing}개 상품은 엑셀에 이미지가 빠졌습니다.")
+        return excel_filenames
+    finally:
+        work_queue.close()
+
+
+# 브랜드와 카테고리 유효성 검사 기준
+AVAIL_BRANDS = [
+    "ASK YOURSELF", "ACNE STUDIOS", "ALEXANDER MCQUEEN", "ALEXANDER WANG", "ALYX",
+    "AMI", "AMIRI", "ARCTERYX", "AUDEMARS PIGUET", "BALENCIAGA", "BALMAIN",
+    "BAPE", "BERLUTI", "BLANCPAIN", "BOTTEGA VENETA", "BREGUET", "BALLY",
+    "BREITLING", "BRUNELLO CUCINELLI", "BULGARI", "BURBERRY", "CANADA GOOSE",
+    "CARTIER", "CASABLANCA", "CELINE", "CHANEL", "CHAUMET", "CHLOE",
+    "CHROME HEARTS", "COMME DES GARCONS", "CP COMPANY", "DELVAUX",
+    "DRIES VAN NOTEN", "DIESEL", "DIOR", "DOLCE & GABBANA", "EMPORIO ARMANI",
+    "FEAR OF GOD", "FENDI", "FERRAGAMO", "GALLERY DEPT", "GENTLE MONSTER",
+    "GIVENCHY", "GOLDEN GOOSE", "GOYARD", "GUCCI", "HERMES", "HUBLOT",
+    "ISABEL MARANT", "IAB STUDIO", "IWC", "JACQUEMUS", "JIL SANDER", "JUNJI",
+    "JIMMY CHOO", "JORDAN", "JUNYA WATANABE", "KENZO", "LANVIN BLANC",
+    "LANVIN", "LEMAIRE", "LOEWE", "LORO PIANA", "LOUBOUTIN", "LOUIS VUITTON",
+    "MACKAGE", "MAISON MARGIELA", "MAISON MIHARA YASUHIRO", "MANOLO BLAHNIK",
+    "MARNI", "MARTINE ROSE", "MAX MARA", "MAISON KITSUNE", "MIU MIU",
+    "MONCLER", "MOOSE KNUCKLES", "NEW BALANCE", "NIKE", "OFF WHITE",
+    "OMEGA", "PHILIPP PLEIN", "PANERAI", "PARAJUMPERS", "PALM ANGELS",
+    "PALACE", "PATEK PHILIPPE", "PRADA", "PIAGET", "POLORALPHLAUREN",
+    "RAY BAN", "RHUDE", "RICK OWENS", "RIMOWA", "ROGER VIVIER", "ROLEX",
+    "SACAI", "SUPREME", "SAINT LAURENT", "SALOMON", "STUSSY", "STONE ISLAND",
+    "TAG HEUER", "THE NORTH FACE", "THOM BROWNE", "TIFFANY & CO", "TOM FORD",
+    "TUDOR", "UMA WANG", "VACHERON CONSTANTIN", "VALENTINO", "VETEMENTS",
+    "VANCLEEF", "VERSACE", "WOOYOUNGMI", "YEEZY", "ZEGNA", "OTHERS",
+]
+
+AVAIL_1ST_CATEGORIES = [
+    "상의", "아우터", "하의", "가방", "신발", "지갑", "시계", "패션잡화", "액세서리", "벨트"
+]
+
+AVAIL_2ND_CATEGORIES = [
+    "반팔 티셔츠", "긴팔 티셔츠", "니트/가디건", "맨투맨", "후드", "원피스", "셔츠", "드레스",
+    "슬리브리스", "셋업", "기타 상의", "집업", "자켓", "패딩", "레더", "코트", "기타 아우터",
+    "팬츠", "쇼츠", "트레이닝 팬츠", "데님", "스커트", "기타 하의", "미니백", "백팩", "숄더백",
+    "토트백", "크로스백", "클러치", "캐리어", "핸드백", "더플백", "버킷백", "기타 가방",
+    "스니커즈", "샌들/슬리퍼", "플랫", "로퍼", "더비/레이스업", "힐/펌프스", "부츠", "기타 신발",
+    "반지갑", "카드지갑", "지퍼장지갑", "중/장지갑", "여권지갑", "WOC", "기타 지갑",
+    "메탈", "가죽", "우레탄", "머플러/스카프", "아이웨어", "넥타이", "모자", "헤어액세서리",
+    "기타 잡화", "반지", "목걸이", "팔찌", "귀걸이", "키링", "브로치", "기타 ACC"
+]
+
+# 결과 엑셀 열 너비
+COLUMN_WIDTHS = {
+    'B': 18,
+    'E': 12,
+    'F': 8.25,
+    'G': 11.25,
+    'H': 12.75,
+    'K': 12.75,
+    'L': 15,
+    'N': 39,
+    'O': 22.5,
+    'P': 12,
+    'Q': 12,
+    'R': 12,
+    'S': 12,
+    'T': 12,
+    'U': 12,
+    'V': 12,
+    'W': 12,
+    'X': 12,
+    'Y': 20,
+    'Z': 20,
+    'AA': 12,
+    'AB': 12,
+    'AC': 12,
+    'AD': 12,
+}
+
+RESULT_COLUMNS = list(new_result_row("", "", "").keys())
+IMAGE_COLUMN_INDEX = RESULT_COLUMNS.index('이미지') + 1
+IMAGE_ROW_HEIGHT = 65
+
+
+def validate_row(row):
+    """
+    목록에 없는 브랜드/카테고리 값을 비운 행을 반환.
+    """
+    row = dict(row)
+    if row['브랜드'] not in AVAIL_BRANDS:
+        row['브랜드'] = ""
+    if row['2차'] not in AVAIL_1ST_CATEGORIES:
+        row['2차'] = ""
+    if row['3차'] not in AVAIL_2ND_CATEGORIES:
+        row['3차'] = ""
+    return row
+
+
+def read_thumbnail(img_path):
+    """
+    작업 큐에 함께 저장할 썸네일 바이트. 이미지가 없거나 썸네일을 만들 수 없으면 None.
+    """
+    if not img_path or not os.path.exists(img_path):
+        return None
+    thumb_path = make_thumbnail(img_path)
+    if thumb_path is None:
+        return None
+    with open(thumb_path, 'rb') as f:
+        return f.read()
+
+
+def restore_thumbnail(img_path, thumbnail):
+    """
+    큐에 저장된 썸네일을 원래 이미지 경로 옆(0.thumb.jpg)에 써서 그 경로를 반환.
+    """
+    root, _ = os.path.splitext(img_path)
+    thumb_path = f"{root}.thumb.jpg"
+    os.makedirs(os.path.dirname(thumb_path) or ".", exist_ok=True)
+    with open(thumb_path, 'wb') as f:
+        f.write(thumbnail)
+    return thumb_path
+
+
+class SiteWorkbookWriter:
+    """
+    사이트 하나의 결과를 write-only 워크북에 한 행씩 바로 기록.
+    행을 메모리에 모아두지 않으므로 상품 수와 관계없이 메모리 사용량이 일정하다.
+    """
+
+    STYLE_NAME = "result_cell"
+
+    def __init__(self, site_name, run_timestamp):
+        import openpyxl
+        from openpyxl.styles import Alignment, Font, NamedStyle
+        from openpyxl.utils import get_column_letter
+        from openpyxl.cell import WriteOnlyCell
+
+        self._cell_class = WriteOnlyCell
+        self.site_name = site_name
+        self.run_timestamp = run_timestamp
+        self.count = 0
+
+        self.wb = openpyxl.Workbook(write_only=True)
+        style = NamedStyle(name=self.STYLE_NAME)
+        style.alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
+        style.font = Font(name='Arial')
+        self.wb.add_named_style(style)
+
+        self.ws = self.wb.create_sheet()
+        self.image_column = get_column_letter(IMAGE_COLUMN_INDEX)
+        # write-only 모드에서는 첫 행을 쓰기 전에 열 너비를 지정해야 함
+        for column, width in COLUMN_WIDTHS.items():
+            self.ws.column_dimensions[column].width = width
+        self.ws.append([self._cell(name) for name in RESULT_COLUMNS])
+
+    def _cell(self, value):
+        cell = self._cell_class(self.ws, value=value)
+        cell.style = self.STYLE_NAME
+        return cell
+
+    def append(self, row):
+        row = validate_row(row)
+        row_index = self.count + 2
+
+        img_path = row['이미지']
+        if img_path != "" and os.path.exists(img_path):
+            # 원본 대신 축소한 썸네일을 삽입해 파일 크기를 줄임
+            from openpyxl.drawing.image import Image as OpenpyxlImage
+
+            img = OpenpyxlImage(make_thumbnail(img_path) or img_path)
+            img.width, img.height = 80, 80
+            self.ws.add_image(img, f"{self.image_column}{row_index}")
+            self.ws.row_dimensions[row_index].height = IMAGE_ROW_HEIGHT
+            row['이미지'] = ""
+
+        self.ws.append([self._cell(row.get(name, "")) for name in RESULT_COLUMNS])
+        # write-only 시트는 append 시점에 행 높이까지 기록하므로 이후에는 필요 없음
+        self.ws.row_dimensions.pop(row_index, None)
+        self.count += 1
+
+    def save(self):
+        excel_filename = f"결과_{self.site_name}_{self.count}개_{self.run_timestamp}.xlsx"
+        with metrics.timer("workbook_save", self.site_name, rows=self.count):
+            self.wb.save(excel_filename)
+        return excel_filename
+
+
+def export_results(rows, run_timestamp=None):
+    """
+    결과 행을 한 번만 순회하면서 사이트별 엑셀 파일에 바로 기록.
+    :param rows: 결과 행 iterable (메모리의 results, 또는 디스크에서 읽는 제너레이터)
+    :return: 저장된 파일 이름 목록
+    """
+    run_timestamp = run_timestamp or timestamp
+    writers = {}
+    for row in rows:
+        site_name = row['거래처']
+        if site_name not in writers:
+            writers[site_name] = SiteWorkbookWriter(site_name, run_timestamp)
+        writers[site_name].append(row)
+
+    return [writer.save() for writer in writers.values()]
+
+
 if __name__ == "__main__":
     import sys
     from io import StringIO
 
+    multiprocessing.freeze_support()  # PyInstaller onefile 에서 프로세스 풀 사용
+    cli_args = parse_args()
+
+    if cli_args.gc_images:
+        removed, freed = get_image_store().gc()
+        print(f"이미지 저장소 정리 완료: {removed}개 파일, {freed / 1024 / 1024:.1f}MB 확보")
+        sys.exit(0)
+
+    if cli_args.enqueue:
+        run_enqueue(cli_args)
+        metrics.report(cli_args.metrics_file)
+        sys.exit(0)
+
+    if cli_args.worker:
+        run_worker(cli_args)
+        metrics.report(cli_args.metrics_file)
+        sys.exit(0)
+
+    if cli_args.finalize:
+        for excel_filename in run_finalize(cli_args):
+            print(f"{excel_filename} 저장 완료")
+        sys.exit(0)
+
+    if cli_args.export_journal:
+        run_id = ResultJournal.resolve_run_id(cli_args.export_journal)
+        for excel_filename in export_results(iter_journal_rows(run_id), run_timestamp=run_id):
+            print(f"{excel_filename} 저장 완료")
+        metrics.report(cli_args.metrics_file)
+        sys.exit(0)
+
     # stdout 리셋
     sys.stdout = StringIO()
 
     try:
         # 리팩토링된 메인 로직 실행
-        results = main()
-        final = list(results.values())
-
-        # 브랜드와 카테고리 유효성 검사
-        avail_brands = [
-            "ASK YOURSELF", "ACNE STUDIOS", "ALEXANDER MCQUEEN", "ALEXANDER WANG", "ALYX",
-            "AMI", "AMIRI", "ARCTERYX", "AUDEMARS PIGUET", "BALENCIAGA", "BALMAIN",
-            "BAPE", "BERLUTI", "BLANCPAIN", "BOTTEGA VENETA", "BREGUET", "BALLY",
-            "BREITLING", "BRUNELLO CUCINELLI", "BULGARI", "BURBERRY", "CANADA GOOSE",
-            "CARTIER", "CASABLANCA", "CELINE", "CHANEL", "CHAUMET", "CHLOE",
-            "CHROME HEARTS", "COMME DES GARCONS", "CP COMPANY", "DELVAUX",
-            "DRIES VAN NOTEN", "DIESEL", "DIOR", "DOLCE & GABBANA", "EMPORIO ARMANI",
-            "FEAR OF GOD", "FENDI", "FERRAGAMO", "GALLERY DEPT", "GENTLE MONSTER",
-            "GIVENCHY", "GOLDEN GOOSE", "GOYARD", "GUCCI", "HERMES", "HUBLOT",
-            "ISABEL MARANT", "IAB STUDIO", "IWC", "JACQUEMUS", "JIL SANDER", "JUNJI",
-            "JIMMY CHOO", "JORDAN", "JUNYA WATANABE", "KENZO", "LANVIN BLANC",
-            "LANVIN", "LEMAIRE", "LOEWE", "LORO PIANA", "LOUBOUTIN", "LOUIS VUITTON",
-            "MACKAGE", "MAISON MARGIELA", "MAISON MIHARA YASUHIRO", "MANOLO BLAHNIK",
-            "MARNI", "MARTINE ROSE", "MAX MARA", "MAISON KITSUNE", "MIU MIU",
-            "MONCLER", "MOOSE KNUCKLES", "NEW BALANCE", "NIKE", "OFF WHITE",
-            "OMEGA", "PHILIPP PLEIN", "PANERAI", "PARAJUMPERS", "PALM ANGELS",
-            "PALACE", "PATEK PHILIPPE", "PRADA", "PIAGET", "POLORALPHLAUREN",
-            "RAY BAN", "RHUDE", "RICK OWENS", "RIMOWA", "ROGER VIVIER", "ROLEX",
-            "SACAI", "SUPREME", "SAINT LAURENT", "SALOMON", "STUSSY", "STONE ISLAND",
-            "TAG HEUER", "THE NORTH FACE", "THOM BROWNE", "TIFFANY & CO", "TOM FORD",
-            "TUDOR", "UMA WANG", "VACHERON CONSTANTIN", "VALENTINO", "VETEMENTS",
-            "VANCLEEF", "VERSACE", "WOOYOUNGMI", "YEEZY", "ZEGNA", "OTHERS",
-        ]
-
-        avail_1st_categories = [
-            "상의", "아우터", "하의", "가방", "신발", "지갑", "시계", "패션잡화", "액세서리", "벨트"
-        ]
-
-        avail_2nd_categories = [
-            "반팔 티셔츠", "긴팔 티셔츠", "니트/가디건", "맨투맨", "후드", "원피스", "셔츠", "드레스",
-            "슬리브리스", "셋업", "기타 상의", "집업", "자켓", "패딩", "레더", "코트", "기타 아우터",
-            "팬츠", "쇼츠", "트레이닝 팬츠", "데님", "스커트", "기타 하의", "미니백", "백팩", "숄더백",
-            "토트백", "크로스백", "클러치", "캐리어", "핸드백", "더플백", "버킷백", "기타 가방",
-            "스니커즈", "샌들/슬리퍼", "플랫", "로퍼", "더비/레이스업", "힐/펌프스", "부츠", "기타 신발",
-            "반지갑", "카드지갑", "지퍼장지갑", "중/장지갑", "여권지갑", "WOC", "기타 지갑",
-            "메탈", "가죽", "우레탄", "머플러/스카프", "아이웨어", "넥타이", "모자", "헤어액세서리",
-            "기타 잡화", "반지", "목걸이", "팔찌", "귀걸이", "키링", "브로치", "기타 ACC"
-        ]
-
-        for index, data in enumerate(final):
-            if data['브랜드'] not in avail_brands:
-                final[index]['브랜드'] = ""
-            if data['2차'] not in avail_1st_categories:
-                final[index]['2차'] = ""
-            if data['3차'] not in avail_2nd_categories:
-                final[index]['3차'] = ""
-
-        df = pd.DataFrame(final)
-
-        # 각 사이트별로 엑셀 파일 생성
-        for site_name, _, _ in category_data:
-            site_data = df[df['거래처'] == site_name]
-            if not site_data.empty:
-                wb = openpyxl.Workbook()
-                ws = wb.active
-
-                ws.append(list(site_data.columns))
-                alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
-                font = Font(name='Arial')
-
-                for cell in ws[1]:
-                    cell.alignment = alignment
-                    cell.font = font
-
-                for idx, row in enumerate(dataframe_to_rows(site_data, index=False, header=False)):
-                    img_path = row[4]
-                    if os.path.exists(img_path) and img_path != "":
-                        img = OpenpyxlImage(img_path)
-                        img.width, img.height = 80, 80
-                        ws.add_image(img, f"E{idx + 2}")
-                        ws.row_dimensions[idx + 2].height = 65
-                        row[4] = ""
-
-                    ws.append(row)
-
-                    for cell in ws[idx + 2]:
-                        cell.alignment = alignment
-                        cell.font = font
-
-                # 열 너비 설정
-                ws.column_dimensions['B'].width = 18
-                ws.column_dimensions['E'].width = 12
-                ws.column_dimensions['F'].width = 8.25
-                ws.column_dimensions['G'].width = 11.25
-                ws.column_dimensions['H'].width = 12.75
-                ws.column_dimensions['K'].width = 12.75
-                ws.column_dimensions['L'].width = 15
-                ws.column_dimensions['N'].width = 39
-                ws.column_dimensions['O'].width = 22.5
-                ws.column_dimensions['P'].width = 12
-                ws.column_dimensions['Q'].width = 12
-                ws.column_dimensions['R'].width = 12
-                ws.column_dimensions['S'].width = 12
-                ws.column_dimensions['T'].width = 12
-                ws.column_dimensions['U'].width = 12
-                ws.column_dimensions['V'].width = 12
-                ws.column_dimensions['W'].width = 12
-                ws.column_dimensions['X'].width = 12
-                ws.column_dimensions['Y'].width = 20
-                ws.column_dimensions['Z'].width = 20
-                ws.column_dimensions['AA'].width = 12
-                ws.column_dimensions['AB'].width = 12
-                ws.column_dimensions['AC'].width = 12
-                ws.column_dimensions['AD'].width = 12
-
-                count = len(site_data)
-                excel_filename = f"결과_{site_name}_{count}개_{timestamp}.xlsx"
-                wb.save(excel_filename)
+        results = main(cli_args)
+
+        # 각 사이트별로 엑셀 파일 생성 (저메모리 모드는 저널에서 한 행씩 읽어서)
+        if cli_args.low_memory:
+            export_results(iter_journal_rows(timestamp))
+        else:
+            export_results(results.values())
+        metrics.report(cli_args.metrics_file)
 
         input("\n작업 완료! 엔터를 눌러 종료하세요 : ")
 